@@ -0,0 +1,221 @@
+"""Persistent cache backends for VoiceAnalyzer results, one entry per row:
+
+* ``SQLiteAnalysisCache`` – SQLite in WAL mode. Inserts touch a single row,
+  lookups read only the requested entry and several processes (API workers,
+  batch jobs) can share the same file safely. Entries can be evicted by age,
+  count and total size.
+* ``MemoryAnalysisCache`` – process-local dict, for tests or when nothing
+  should be written to disk.
+
+Keys are built with ``make_cache_key`` from the audio hash and the analysis
+parameters, so changing e.g. the window length never returns a stale result.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def make_cache_key(audio_hash, params=None):
+    """Build a cache key from an audio content hash and the analysis parameters.
+
+    Args:
+        audio_hash (str): Hash of the audio content.
+        params (dict): JSON-serialisable analysis parameters (window/hop lengths,
+                       model identifiers, ...). Key order does not matter.
+    """
+    if not params:
+        return audio_hash
+    digest = hashlib.sha1(json.dumps(params, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:16]
+    return f"{audio_hash}:{digest}"
+
+
+def hash_file(path, chunk_size=1 << 20):
+    """SHA-1 of a file's raw bytes, read in chunks so large uploads stay out of memory."""
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class AnalysisCache:
+    """Interface shared by the cache backends."""
+
+    def get(self, key):
+        """Return the cached value for ``key`` or ``None``."""
+        raise NotImplementedError
+
+    def set(self, key, value):
+        """Store a JSON-serialisable ``value`` under ``key``."""
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def evict(self):
+        """Drop entries exceeding the configured age/count/size limits."""
+        return 0
+
+    def close(self):
+        pass
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self.set(key, value)
+
+
+class MemoryAnalysisCache(AnalysisCache):
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            return self._data.get(key)
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLiteAnalysisCache(AnalysisCache):
+    """SQLite (WAL) cache safe to share between threads and processes.
+
+    Args:
+        path (str): Database file path.
+        max_entries (int): Keep at most this many entries (least recently used go first).
+        max_bytes (int): Keep the total size of stored values under this many bytes.
+        max_age_s (float): Drop entries created longer ago than this.
+        evict_every (int): Run eviction after this many inserts from this process.
+        touch_interval_s (float): Refresh an entry's access time on a hit only when it
+                                  is older than this, so most hits take no write lock.
+    """
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS entries (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            created REAL NOT NULL,
+            accessed REAL NOT NULL
+        )
+    """
+
+    def __init__(self, path="voice_cache.sqlite3", max_entries=None, max_bytes=None,
+                 max_age_s=None, evict_every=100, touch_interval_s=60.0):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_age_s = max_age_s
+        self.evict_every = max(1, int(evict_every))
+        self.touch_interval_s = touch_interval_s
+        self._local = threading.local()
+        self._inserts = 0
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        conn = self._conn()
+        with conn:
+            conn.execute(self._SCHEMA)
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+        self.evict()
+
+    def _conn(self):
+        # One connection per thread, re-opened after a fork.
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        try:
+            conn = self._conn()
+            row = conn.execute("SELECT value, accessed FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            now = time.time()
+            if now - row[1] > self.touch_interval_s:
+                conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, key))
+            return json.loads(row[0])
+        except (sqlite3.Error, ValueError) as e:
+            logger.error(f"Cache lookup failed for {key}: {e}")
+            return None
+
+    def set(self, key, value):
+        try:
+            payload = json.dumps(value)
+            now = time.time()
+            self._conn().execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, payload, len(payload), now, now),
+            )
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            logger.error(f"Cache write failed for {key}: {e}")
+            return
+        self._inserts += 1
+        if self._inserts % self.evict_every == 0:
+            self.evict()
+
+    def delete(self, key):
+        self._conn().execute("DELETE FROM entries WHERE key = ?", (key,))
+
+    def evict(self):
+        """Apply the age, count and size limits. Returns the number of entries removed."""
+        removed = 0
+        try:
+            conn = self._conn()
+            with conn:
+                if self.max_age_s is not None:
+                    removed += conn.execute(
+                        "DELETE FROM entries WHERE created < ?", (time.time() - self.max_age_s,)
+                    ).rowcount
+                if self.max_entries is not None:
+                    removed += conn.execute(
+                        "DELETE FROM entries WHERE key IN ("
+                        " SELECT key FROM entries ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                        (int(self.max_entries),),
+                    ).rowcount
+                if self.max_bytes is not None:
+                    removed += conn.execute(
+                        "DELETE FROM entries WHERE key IN ("
+                        " SELECT key FROM (SELECT key, SUM(size) OVER (ORDER BY accessed DESC) AS running"
+                        " FROM entries) WHERE running > ?)",
+                        (int(self.max_bytes),),
+                    ).rowcount
+        except sqlite3.Error as e:
+            logger.error(f"Cache eviction failed: {e}")
+        return removed
+
+    def __len__(self):
+        return self._conn().execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
@@ -10,24 +10,232 @@ If --user-id is supplied and Firebase is initialised (i.e. serviceAccountKey.jso
 present), the results will also be pushed to
   users/<USER_ID>/voice_analyses/<auto_id>
 under the Realtime Database at https://mindfulapp-ad0fa-default-rtdb.firebaseio.com/.
+
+Batch mode:
+    python analyze_audio.py --input-dir sessions/ [--workers 4] [--out results.jsonl]
+    python analyze_audio.py --manifest files.txt --out-dir analyses/
+
+Files are spread over --workers processes, each loading the models once.
+Results go to a single JSONL (or .parquet, which needs ``pip install pyarrow``)
+file given by --out (default analysis_results.jsonl), or to one
+<name>_analysis.json per file with --out-dir, laid out like the input
+directory (or the manifest's directory). Files already recorded in the
+output, or already in the analysis cache, are not re-analysed, so an
+interrupted run resumes where it stopped. Throughput (files/s and
+audio-seconds/s) is printed as the run progresses. --user-id is only
+supported for single files.
 """
 
 import argparse
+import hashlib
 import json
+import multiprocessing as mp
 import os
+import time
 from datetime import datetime
 
 from voice_analysis import VoiceAnalyzer
 
+AUDIO_EXTENSIONS = ('.wav', '.mp3', '.ogg', '.flac')
+
+_worker_analyzer = None
+
+
+def _init_worker():
+    global _worker_analyzer
+    _worker_analyzer = VoiceAnalyzer()
+    _worker_analyzer.warm_up()
+
+
+def _analyze_file(audio_path):
+    start = time.perf_counter()
+    try:
+        result = _worker_analyzer.analyze_audio(audio_path)
+        error = None if result is not None else "Analysis failed"
+    except Exception as e:
+        result, error = None, str(e)
+    return audio_path, result, error, time.perf_counter() - start
+
+
+def _result_duration(result):
+    if not result:
+        return 0.0
+    return float(result.get("metadata", {}).get("duration", result.get("duration", 0.0)))
+
+
+def collect_inputs(input_dir=None, manifest=None):
+    """Audio paths from a directory (recursively) or a manifest with one path per line."""
+    paths = []
+    if input_dir:
+        for root, _, files in os.walk(input_dir):
+            paths.extend(os.path.join(root, f) for f in files if f.lower().endswith(AUDIO_EXTENSIONS))
+    if manifest:
+        base = os.path.dirname(os.path.abspath(manifest))
+        with open(manifest, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith("#"):
+                    paths.append(line if os.path.isabs(line) else os.path.join(base, line))
+    return sorted(set(paths))
+
+
+class BatchWriter:
+    """Writes batch results as JSONL / Parquet or per-file JSON and knows what is already done.
+
+    Args:
+        out (str): JSONL or ``.parquet`` output path.
+        out_dir (str): Write one JSON file per input here instead, at the input's
+                       path relative to ``root``.
+        root (str): Directory the inputs are mirrored from (the input directory
+                    or the manifest's directory).
+    """
+
+    def __init__(self, out=None, out_dir=None, root=None):
+        self.out_dir = out_dir
+        self.root = os.path.abspath(root or os.curdir)
+        self.parquet_path = None
+        self.jsonl_path = None
+        if out_dir:
+            os.makedirs(out_dir, exist_ok=True)
+        else:
+            out = out or "analysis_results.jsonl"
+            if out.endswith(".parquet"):
+                try:
+                    import pyarrow  # noqa: F401  (pandas' Parquet engine)
+                except ImportError:
+                    raise RuntimeError("Parquet output needs pyarrow: pip install pyarrow") from None
+                self.parquet_path = out
+                self.jsonl_path = out + ".partial.jsonl"
+            else:
+                self.jsonl_path = out
+        self._done = self._load_done()
+        self._file = open(self.jsonl_path, "a", encoding="utf-8") if self.jsonl_path else None
+
+    def _json_path(self, audio_path):
+        audio_path = os.path.abspath(audio_path)
+        relative = os.path.relpath(audio_path, self.root)
+        if relative.startswith(os.pardir):
+            # Outside the root (absolute manifest entries): basename plus a hash of the full path
+            digest = hashlib.sha1(audio_path.encode("utf-8")).hexdigest()[:8]
+            relative = f"{os.path.splitext(os.path.basename(audio_path))[0]}_{digest}"
+        else:
+            relative = os.path.splitext(relative)[0]
+        return os.path.join(self.out_dir, relative + "_analysis.json")
+
+    def _load_done(self):
+        done = set()
+        if self.jsonl_path and os.path.exists(self.jsonl_path):
+            with open(self.jsonl_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # partially written line from an interrupted run
+                    if record.get("status") == "ok":
+                        done.add(record["path"])
+        return done
+
+    def is_done(self, audio_path):
+        if self.out_dir:
+            return os.path.exists(self._json_path(audio_path))
+        return audio_path in self._done
+
+    def write(self, audio_path, result, error=None, seconds=None):
+        if self.out_dir:
+            if result is not None:
+                json_path = self._json_path(audio_path)
+                os.makedirs(os.path.dirname(json_path), exist_ok=True)
+                with open(json_path, "w", encoding="utf-8") as f:
+                    json.dump(result, f, indent=2)
+            return
+        record = {"path": audio_path, "status": "ok" if result is not None else "failed",
+                  "error": error, "seconds": seconds, "result": result}
+        self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
+
+    def close(self):
+        if self._file:
+            self._file.close()
+        if self.parquet_path:
+            import pandas as pd
+
+            records = {}  # latest record per path: a retried file replaces its failed attempt
+            with open(self.jsonl_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    record["result"] = json.dumps(record["result"])
+                    records.pop(record["path"], None)
+                    records[record["path"]] = record
+            pd.DataFrame.from_records(list(records.values())).to_parquet(self.parquet_path, index=False)
+            print(f"Results saved to {self.parquet_path}")
+
+
+def run_batch(paths, writer, workers):
+    todo = [p for p in paths if not writer.is_done(p)]
+    print(f"{len(paths)} files, {len(paths) - len(todo)} already in output")
+
+    # Cached files are written straight from the cache without starting a worker
+    probe = VoiceAnalyzer()
+    pending = []
+    for path in todo:
+        cached = probe.cached_result(path)
+        if cached is not None:
+            writer.write(path, cached, seconds=0.0)
+        else:
+            pending.append(path)
+    print(f"{len(todo) - len(pending)} served from cache, {len(pending)} to analyse with {workers} workers")
+
+    start = time.perf_counter()
+    files_done, audio_seconds, failures = 0, 0.0, 0
+    if pending:
+        with mp.get_context("spawn").Pool(workers, initializer=_init_worker) as pool:
+            for path, result, error, seconds in pool.imap_unordered(_analyze_file, pending):
+                writer.write(path, result, error, seconds)
+                files_done += 1
+                failures += result is None
+                audio_seconds += _result_duration(result)
+                elapsed = time.perf_counter() - start
+                print(f"[{files_done}/{len(pending)}] {path} "
+                      f"{'ok' if result is not None else 'FAILED: ' + str(error)} "
+                      f"({files_done / elapsed:.2f} files/s, {audio_seconds / elapsed:.1f} audio-s/s)")
+    writer.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"Done: {files_done} files analysed ({failures} failed) in {elapsed:.1f}s")
+    if elapsed > 0 and files_done:
+        print(f"Throughput: {files_done / elapsed:.2f} files/s, {audio_seconds / elapsed:.1f} audio-seconds/s")
+
 
 def main():
     parser = argparse.ArgumentParser(description="Run voice analysis and save results as JSON.")
-    parser.add_argument("--audio", required=True, help="Path to the .wav file to analyse")
-    parser.add_argument("--out", help="Output JSON path (defaults to <audio>_analysis.json)")
-    parser.add_argument("--user-id", help="Firebase user id to store results under (optional)")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--audio", help="Path to the .wav file to analyse")
+    source.add_argument("--input-dir", help="Analyse every audio file under this directory")
+    source.add_argument("--manifest", help="Analyse the audio files listed in this file (one per line)")
+    parser.add_argument("--out", help="Output JSON path (defaults to <audio>_analysis.json); "
+                                      "in batch mode a .jsonl or .parquet file")
+    parser.add_argument("--out-dir", help="Batch mode: write one <name>_analysis.json per file here")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help="Batch mode: number of worker processes")
+    parser.add_argument("--user-id", help="Firebase user id to store results under (optional, single files only)")
 
     args = parser.parse_args()
 
+    if args.input_dir or args.manifest:
+        if args.user_id:
+            parser.error("--user-id is not supported in batch mode")
+        root = args.input_dir or os.path.dirname(os.path.abspath(args.manifest))
+        try:
+            writer = BatchWriter(args.out, args.out_dir, root=root)
+        except RuntimeError as e:
+            parser.error(str(e))
+        paths = collect_inputs(args.input_dir, args.manifest)
+        run_batch(paths, writer, max(1, args.workers))
+        return
+
     audio_path = args.audio
     if not os.path.exists(audio_path):
         raise FileNotFoundError(f"Audio file not found: {audio_path}")
@@ -0,0 +1,225 @@
+"""Vectorised framing helpers shared by the VoiceAnalyzer feature functions.
+
+* ``frame_signal`` returns a zero-copy strided ``[frames, frame_length]`` view.
+* ``frame_energy`` and ``frame_rms`` use differences of a cumulative sum of
+  squares, so the cost is O(len(y)) whatever the frame/hop ratio and no
+  per-frame temporaries are allocated.
+
+``FeaturePlane`` ties them together per clip: it computes the STFT magnitude
+once and derives pitch tracks, RMS, energy, ZCR and silence masks from the
+clip lazily, memoising each so no feature function repeats framing or FFT work.
+
+Pitch (``FeaturePlane.f0``) has pluggable backends, all returning one f0 per
+frame restricted to ``[fmin, fmax]``:
+
+* ``"autocorr"`` (default) – autocorrelation from the shared STFT (inverse FFT
+  of the power spectrum), so it needs no extra forward FFT of the signal.
+* ``"yin"`` – ``librosa.yin``, vectorised YIN over the time-domain frames.
+* ``"piptrack"`` – strongest ``librosa.piptrack`` candidate per frame, kept for
+  comparison with the legacy dense pitch matrix.
+"""
+
+import librosa
+import numpy as np
+import scipy.fft
+from scipy.signal import get_window
+
+PITCH_BACKENDS = ("yin", "autocorr", "piptrack")
+
+
+def frame_signal(y, frame_length, hop_length):
+    """Zero-copy view of the full frames of ``y``, shape ``[n_frames, frame_length]``.
+
+    Frames start at ``0, hop_length, 2 * hop_length, ...``; a trailing partial
+    frame is not included. The view is read-only.
+    """
+    y = np.asarray(y)
+    if len(y) < frame_length:
+        return np.empty((0, frame_length), dtype=y.dtype)
+    return np.lib.stride_tricks.sliding_window_view(y, frame_length)[::hop_length]
+
+
+def _cumulative_power(y):
+    power = np.empty(len(y) + 1, dtype=np.float64)
+    power[0] = 0.0
+    np.cumsum(np.square(y, dtype=np.float64), out=power[1:])
+    return power
+
+
+def frame_energy(y, frame_length, hop_length):
+    """Sum of squares of ``y[i:i + frame_length]`` for every ``i`` in ``range(0, len(y), hop_length)``.
+
+    Frames near the end are truncated at ``len(y)``, exactly like slicing would.
+    """
+    y = np.asarray(y)
+    if len(y) == 0:
+        return np.zeros(0)
+    power = _cumulative_power(y)
+    starts = np.arange(0, len(y), hop_length)
+    ends = np.minimum(starts + frame_length, len(y))
+    return power[ends] - power[starts]
+
+
+def frame_rms(y, frame_length, hop_length, center=True):
+    """Frame RMS, matching ``librosa.feature.rms(y=y, frame_length, hop_length, center)[0]``.
+
+    With ``center=True`` the signal is zero-padded by ``frame_length // 2`` on both
+    sides, as librosa does, so frame ``t`` is centred on sample ``t * hop_length``.
+    """
+    y = np.asarray(y)
+    if center:
+        pad = frame_length // 2
+        n_frames = 1 + len(y) // hop_length
+        starts = np.arange(n_frames) * hop_length - pad
+    else:
+        if len(y) < frame_length:
+            return np.zeros(0)
+        n_frames = 1 + (len(y) - frame_length) // hop_length
+        starts = np.arange(n_frames) * hop_length
+    power = _cumulative_power(y)
+    # Zero padding contributes nothing, so clipping the bounds to the signal is exact
+    lo = np.clip(starts, 0, len(y))
+    hi = np.clip(starts + frame_length, 0, len(y))
+    mean_power = np.maximum(power[hi] - power[lo], 0.0) / frame_length
+    return np.sqrt(mean_power)
+
+
+class FeaturePlane:
+    """Per-clip feature cache built around a single STFT.
+
+    The magnitude spectrogram is computed once (float32, in blocks of frames
+    through one reusable buffer) on first use and shared by every spectral
+    feature of the clip; each derived feature is memoised by its parameters.
+    Time-domain curves (RMS, energy, silence mask) come from the cumulative-sum
+    helpers above, which are cheaper than any FFT, and are memoised the same way.
+
+    Args:
+        y (np.ndarray): Mono signal.
+        sr (int): Sample rate.
+        n_fft (int): FFT size of the shared STFT (librosa's default).
+        hop_length (int): Hop of the shared STFT (librosa's default ``n_fft // 4``).
+        block_frames (int): Frames transformed per block when building the STFT.
+    """
+
+    def __init__(self, y, sr, n_fft=2048, hop_length=512, block_frames=256):
+        self.y = np.asarray(y)
+        self.sr = sr
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+        self.block_frames = block_frames
+        self._magnitude = None
+        self._memo = {}
+
+    def _memoised(self, key, compute):
+        if key not in self._memo:
+            self._memo[key] = compute()
+        return self._memo[key]
+
+    @property
+    def magnitude(self):
+        """``|STFT|`` of shape ``[1 + n_fft // 2, 1 + len(y) // hop_length]``, as ``np.abs(librosa.stft(y))``."""
+        if self._magnitude is None:
+            self._magnitude = self._stft_magnitude()
+        return self._magnitude
+
+    def _stft_magnitude(self):
+        pad = self.n_fft // 2
+        padded = np.pad(self.y.astype(np.float32, copy=False), pad)
+        frames = frame_signal(padded, self.n_fft, self.hop_length)
+        window = get_window("hann", self.n_fft, fftbins=True).astype(np.float32)
+        magnitude = np.empty((self.n_fft // 2 + 1, len(frames)), dtype=np.float32)
+        buf = np.empty((min(self.block_frames, len(frames)), self.n_fft), dtype=np.float32)
+        for i in range(0, len(frames), self.block_frames):
+            block = frames[i:i + self.block_frames]
+            np.multiply(block, window, out=buf[:len(block)])
+            magnitude[:, i:i + len(block)] = np.abs(scipy.fft.rfft(buf[:len(block)], axis=1)).T
+        return magnitude
+
+    def pitch_track(self, fmin=150.0, fmax=4000.0, threshold=0.1):
+        """``librosa.piptrack`` on the shared spectrogram; returns ``(pitches, magnitudes)``."""
+        return self._memoised(("piptrack", fmin, fmax, threshold), lambda: librosa.piptrack(
+            S=self.magnitude, sr=self.sr, hop_length=self.hop_length, fmin=fmin, fmax=fmax, threshold=threshold))
+
+    def pitch_values(self, fmin=150.0, fmax=4000.0):
+        """All nonzero piptrack pitch candidates, flattened."""
+        def compute():
+            pitches, _ = self.pitch_track(fmin, fmax)
+            return pitches[pitches > 0]
+        return self._memoised(("pitch_values", fmin, fmax), compute)
+
+    def rms(self, frame_length, hop_length, center=True):
+        return self._memoised(("rms", frame_length, hop_length, center),
+                              lambda: frame_rms(self.y, frame_length, hop_length, center))
+
+    def energy(self, frame_length, hop_length):
+        return self._memoised(("energy", frame_length, hop_length),
+                              lambda: frame_energy(self.y, frame_length, hop_length))
+
+    def silence_mask(self, frame_length, threshold):
+        """Frames (non-overlapping, ``frame_length`` long) whose RMS is below ``threshold``."""
+        return self._memoised(("silence", frame_length, threshold),
+                              lambda: self.rms(frame_length, frame_length) < threshold)
+
+    def zero_crossing_rate(self, frame_length=2048, hop_length=512):
+        return self._memoised(("zcr", frame_length, hop_length), lambda: librosa.feature.zero_crossing_rate(
+            self.y, frame_length=frame_length, hop_length=hop_length)[0])
+
+    def f0(self, backend="autocorr", fmin=75.0, fmax=400.0, min_rms=0.0):
+        """One f0 estimate (Hz) per STFT frame, 0 where the frame is unvoiced.
+
+        Frames whose RMS is below ``min_rms`` are treated as unvoiced whatever the
+        backend says.
+        """
+        if backend not in PITCH_BACKENDS:
+            raise ValueError(f"Unknown pitch backend: {backend}")
+
+        def compute():
+            if backend == "yin":
+                f0 = librosa.yin(self.y, fmin=fmin, fmax=fmax, sr=self.sr,
+                                 frame_length=self.n_fft, hop_length=self.hop_length)
+            elif backend == "autocorr":
+                f0 = self._autocorr_f0(fmin, fmax)
+            else:
+                pitches, magnitudes = self.pitch_track(fmin, fmax)
+                best = np.argmax(magnitudes, axis=0)
+                f0 = pitches[best, np.arange(pitches.shape[1])]
+            f0 = np.where((f0 >= fmin) & (f0 <= fmax), f0, 0.0)
+            if min_rms > 0:
+                f0[self.rms(self.n_fft, self.hop_length) < min_rms] = 0.0
+            return f0
+
+        return self._memoised(("f0", backend, fmin, fmax, min_rms), compute)
+
+    def _autocorr_f0(self, fmin, fmax, voicing_threshold=0.3, peak_ratio=0.9):
+        """Autocorrelation pitch from the shared magnitude spectrogram.
+
+        The autocorrelation of each windowed frame is the inverse FFT of its power
+        spectrum; dividing by the window's own autocorrelation removes the taper
+        bias. The first local peak within ``peak_ratio`` of the best peak in the
+        lag range is taken (avoiding sub-octave errors) and refined by parabolic
+        interpolation.
+        """
+        min_lag = max(1, int(np.floor(self.sr / fmax)))
+        max_lag = min(self.n_fft // 2 - 1, int(np.ceil(self.sr / fmin)))
+        window = get_window("hann", self.n_fft, fftbins=True)
+        window_acf = scipy.fft.irfft(np.abs(scipy.fft.rfft(window)) ** 2, n=self.n_fft)[:max_lag + 2]
+
+        magnitude = self.magnitude
+        f0 = np.zeros(magnitude.shape[1])
+        for i in range(0, magnitude.shape[1], self.block_frames):
+            power = np.square(magnitude[:, i:i + self.block_frames], dtype=np.float64)
+            acf = scipy.fft.irfft(power, n=self.n_fft, axis=0)[:max_lag + 2]
+            r0 = acf[0]
+            norm = acf / window_acf[:, None] * window_acf[0] / np.where(r0 > 0, r0, 1.0)
+            seg = norm[min_lag - 1:max_lag + 2]  # one lag of context on each side
+            inner = seg[1:-1]
+            is_peak = (inner >= seg[:-2]) & (inner >= seg[2:]) & (inner >= peak_ratio * inner.max(axis=0))
+            idx = np.argmax(is_peak, axis=0)
+            cols = np.arange(inner.shape[1])
+            left, centre, right = seg[idx, cols], inner[idx, cols], seg[idx + 2, cols]
+            denom = left - 2 * centre + right
+            shift = np.where(np.abs(denom) > 1e-12, 0.5 * (left - right) / denom, 0.0)
+            lag = min_lag + idx + np.clip(shift, -0.5, 0.5)
+            voiced = (centre >= voicing_threshold) & (r0 > 0)
+            f0[i:i + inner.shape[1]] = np.where(voiced, self.sr / lag, 0.0)
+        return f0
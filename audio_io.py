@@ -0,0 +1,342 @@
+"""Audio decoding for the analysis pipeline: uploads held in memory and files.
+
+Uploads are read from the request stream into memory (``read_upload``) and
+decoded from there (``decode_bytes``):
+
+* 16 kHz mono PCM WAV – the format the pipeline works in – is mapped straight
+  from the upload bytes into a float32 array: 16-bit samples are scaled in one
+  pass, float32 samples are used in place;
+* other PCM16 / float32 WAV uploads are read the same way, then down-mixed
+  and resampled (see ``load_file`` below); other formats (FLAC / OGG / MP3...)
+  are decoded by soundfile from a ``BytesIO`` over the upload bytes;
+* only uploads larger than ``spill_bytes``, or in a format soundfile cannot
+  read from memory, are written to a temporary file.
+
+The analyzer accepts the result of ``read_upload`` (bytes or a path) wherever
+it accepts an audio path.
+
+Files are decoded by ``load_file``, which ``VoiceAnalyzer.load_audio`` uses:
+
+* the header is inspected first; PCM16 / float32 WAV samples are read
+  directly (through ``np.memmap`` for files above ``MMAP_BYTES``), other
+  formats by soundfile as float32, with no float64 intermediate;
+* only the requested ``offset`` / ``duration`` range is read and converted;
+* audio already at 16 kHz is not resampled at all; other rates go straight
+  through soxr when it is installed (librosa >= 0.10 depends on it), otherwise
+  through ``scipy.signal.resample_poly`` when the rate ratio reduces to small
+  integers (48k, 44.1k, 32k, 22.05k, 8k...).
+
+``bench_loader.py`` compares ``load_file`` with ``librosa.load``.
+
+Example:
+    source = read_upload(request.files["audio"].stream, max_bytes=200 << 20)
+    y, sr = decode_bytes(source)              # when source is bytes
+    y, sr = load_file("call.wav", offset=60.0, duration=30.0)
+"""
+
+import hashlib
+import io
+import math
+import os
+import struct
+import tempfile
+
+import librosa
+import numpy as np
+import soundfile as sf
+from scipy import signal
+
+try:
+    import soxr
+except ImportError:
+    soxr = None
+
+from analysis_cache import hash_file
+
+TARGET_SR = 16000
+READ_CHUNK = 1 << 20
+HEADER_BYTES = 1 << 16     # read to find the WAV data chunk of a file
+MMAP_BYTES = 64 << 20      # WAV files at least this large are memory-mapped
+MAX_POLY_FACTOR = 1000     # largest up/down factor handed to resample_poly
+RESAMPLERS = ("auto", "soxr", "poly", "librosa")
+
+WAVE_FORMAT_PCM = 1
+WAVE_FORMAT_IEEE_FLOAT = 3
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+class UploadTooLarge(Exception):
+    """Raised by ``read_upload`` when the upload exceeds ``max_bytes``."""
+
+
+def is_in_memory(source):
+    return isinstance(source, (bytes, bytearray, memoryview))
+
+
+def source_hash(source):
+    """SHA-1 of the encoded audio, identical for a path and for its bytes."""
+    if is_in_memory(source):
+        return hashlib.sha1(source).hexdigest()
+    return hash_file(source)
+
+
+def source_size(source):
+    return memoryview(source).nbytes if is_in_memory(source) else os.path.getsize(source)
+
+
+def read_upload(stream, max_bytes, spill_bytes=32 << 20, suffix=""):
+    """Read an upload stream into memory, spilling to a temp file past ``spill_bytes``.
+
+    Args:
+        stream: Binary file-like object (e.g. ``FileStorage.stream``).
+        max_bytes (int): Largest accepted upload; ``UploadTooLarge`` is raised
+                         as soon as more has been read.
+        spill_bytes (int): Uploads larger than this are written to disk.
+        suffix (str): File extension for the spill file.
+
+    A stream that is already a named file on disk (as ``voice_api`` parses large
+    uploads into) is not copied: its path is returned.
+
+    Returns:
+        bytes | str: The upload bytes, or the path of the spill file (the
+        caller deletes it).
+    """
+    name = getattr(stream, "name", None)
+    if isinstance(name, str) and os.path.isfile(name):
+        stream.flush()
+        if os.path.getsize(name) > max_bytes:
+            raise UploadTooLarge(f"Upload exceeds {max_bytes} bytes")
+        return name
+    chunks, total, spill = [], 0, None
+    try:
+        for chunk in iter(lambda: stream.read(READ_CHUNK), b""):
+            total += len(chunk)
+            if total > max_bytes:
+                raise UploadTooLarge(f"Upload exceeds {max_bytes} bytes")
+            if spill is None and total > spill_bytes:
+                spill = tempfile.NamedTemporaryFile(delete=False, suffix=suffix)
+                spill.writelines(chunks)
+                chunks = []
+            if spill is not None:
+                spill.write(chunk)
+            else:
+                chunks.append(chunk)
+    except BaseException:
+        if spill is not None:
+            spill.close()
+            os.remove(spill.name)
+        raise
+    if spill is not None:
+        spill.close()
+        return spill.name
+    return b"".join(chunks)
+
+
+def parse_wav_header(data, file_size=None):
+    """Format of a RIFF/WAVE file from its first bytes, or ``None`` if it is not one.
+
+    Args:
+        data (bytes): The file, or at least its header chunks.
+        file_size (int): Size of the whole file when ``data`` is only its start.
+
+    Returns:
+        dict: ``format`` (PCM / IEEE float tag, extensible resolved), ``channels``,
+        ``sr``, ``bits``, ``data_offset`` and ``data_size`` (bytes of sample data).
+    """
+    data = memoryview(data)
+    if len(data) < 12 or bytes(data[:4]) != b"RIFF" or bytes(data[8:12]) != b"WAVE":
+        return None
+    fmt, pos = None, 12
+    while pos + 8 <= len(data):
+        chunk_id = bytes(data[pos:pos + 4])
+        (chunk_size,) = struct.unpack_from("<I", data, pos + 4)
+        body = pos + 8
+        if chunk_id == b"fmt " and chunk_size >= 16:
+            tag, channels, sr, _, _, bits = struct.unpack_from("<HHIIHH", data, body)
+            if tag == WAVE_FORMAT_EXTENSIBLE and chunk_size >= 40:
+                (tag,) = struct.unpack_from("<H", data, body + 24)  # first two bytes of the sub-format GUID
+            fmt = {"format": tag, "channels": channels, "sr": sr, "bits": bits}
+        elif chunk_id == b"data" and fmt is not None:
+            # Streamed writers leave the size at 0 or 0xFFFFFFFF; trust the file size then
+            available = (file_size if file_size is not None else len(data)) - body
+            size = chunk_size if 0 < chunk_size <= available else available
+            return dict(fmt, data_offset=body, data_size=size - size % (fmt["bits"] // 8 * fmt["channels"] or 1))
+        pos = body + chunk_size + (chunk_size & 1)
+    return None
+
+
+def audio_duration(source):
+    """Duration in seconds read from the header of a file or upload bytes.
+
+    Returns ``None`` when it cannot be known without decoding (e.g. formats
+    libsndfile does not read).
+    """
+    try:
+        if is_in_memory(source):
+            header, file = parse_wav_header(source), io.BytesIO(source)
+        else:
+            with open(source, "rb") as f:
+                header, file = parse_wav_header(f.read(HEADER_BYTES), os.path.getsize(source)), source
+        if header is not None and header["channels"] and header["bits"] >= 8 and header["sr"]:
+            return header["data_size"] / (header["bits"] // 8 * header["channels"]) / header["sr"]
+        return sf.info(file).duration
+    except (sf.LibsndfileError, RuntimeError, OSError, struct.error):
+        return None
+
+
+def _wav_dtype(header):
+    """numpy dtype of the samples of a PCM16 / float32 WAV, ``None`` for other encodings."""
+    if header is None or header["channels"] == 0:
+        return None
+    if header["format"] == WAVE_FORMAT_PCM and header["bits"] == 16:
+        return np.dtype("<i2")
+    if header["format"] == WAVE_FORMAT_IEEE_FLOAT and header["bits"] == 32:
+        return np.dtype("<f4")
+    return None
+
+
+def _frame_range(n_frames, sr, offset, duration):
+    start = min(n_frames, max(0, int(round(offset * sr))))
+    stop = n_frames if duration is None else min(n_frames, start + max(0, int(round(duration * sr))))
+    return start, stop
+
+
+def _wav_range(header, dtype, offset, duration):
+    """``(byte offset, sample count)`` of the ``offset``/``duration`` range of a WAV's data."""
+    channels = header["channels"]
+    frame_bytes = dtype.itemsize * channels
+    start, stop = _frame_range(header["data_size"] // frame_bytes, header["sr"], offset, duration)
+    return header["data_offset"] + start * frame_bytes, (stop - start) * channels
+
+
+def _wav_samples(raw, channels):
+    """Mono float32 samples from interleaved PCM16 / float32 WAV samples.
+
+    Returns:
+        np.ndarray: float32 samples; ``raw`` itself for mono float32 data.
+    """
+    frames = raw
+    if channels > 1:
+        frames = raw.reshape(-1, channels).mean(axis=1, dtype=np.float32)
+    elif raw.dtype == np.float32:
+        return raw
+    if raw.dtype.kind == "i":
+        y = np.empty(len(frames), dtype=np.float32)
+        np.multiply(frames, np.float32(1 / 32768), out=y, casting="unsafe")
+        return y
+    return frames
+
+
+def to_mono(y):
+    """Average the channels of a ``[samples, channels]`` soundfile array."""
+    return y.mean(axis=1, dtype=np.float32) if y.ndim == 2 else y
+
+
+def resolve_resampler(resampler):
+    """The resampler ``resample`` actually uses: "auto" picks soxr when it is installed."""
+    if resampler not in RESAMPLERS:
+        raise ValueError(f"Unknown resampler: {resampler}")
+    if resampler == "auto":
+        return "soxr" if soxr is not None else "poly"
+    return resampler
+
+
+def resample(y, orig_sr, target_sr, resampler="auto"):
+    """Resample float32 audio, not at all when the rates already match.
+
+    Args:
+        resampler (str): "soxr" calls soxr directly (what librosa >= 0.10 uses,
+                         without the float64 round trip); "poly" uses
+                         ``scipy.signal.resample_poly`` when the rate ratio reduces
+                         to factors up to ``MAX_POLY_FACTOR``; "librosa" uses
+                         ``librosa.resample`` with its default filter, as
+                         ``librosa.load`` does, and is the fallback of the others;
+                         "auto" is "soxr" if installed, else "poly".
+    """
+    if orig_sr == target_sr:
+        return y
+    resampler = resolve_resampler(resampler)
+    if resampler == "soxr" and soxr is not None:
+        return soxr.resample(y, orig_sr, target_sr, quality="HQ").astype(np.float32, copy=False)
+    if resampler == "poly":
+        g = math.gcd(int(orig_sr), int(target_sr))
+        up, down = int(target_sr) // g, int(orig_sr) // g
+        if max(up, down) <= MAX_POLY_FACTOR:
+            return signal.resample_poly(y, up, down).astype(np.float32, copy=False)
+    return librosa.resample(y, orig_sr=orig_sr, target_sr=target_sr)
+
+
+def _soundfile_samples(file, offset, duration):
+    """Mono float32 samples of a range of any file soundfile can read."""
+    with sf.SoundFile(file) as f:
+        start, stop = _frame_range(f.frames, f.samplerate, offset, duration)
+        f.seek(start)
+        y = f.read(stop - start, dtype="float32", always_2d=False)
+        return to_mono(y), f.samplerate
+
+
+def decode_bytes(data, target_sr=TARGET_SR, offset=0.0, duration=None, resampler="auto"):
+    """Decode encoded audio held in memory to mono float32 at ``target_sr``.
+
+    Args:
+        data (bytes): The encoded file (WAV, FLAC, OGG, MP3, ...).
+        target_sr (int): Output sample rate.
+        offset (float): Start of the range to decode, in seconds.
+        duration (float): Length of the range; ``None`` decodes to the end.
+        resampler (str): See ``resample``.
+
+    Returns:
+        tuple: ``(y, target_sr)``; ``y`` may be a read-only view of ``data``.
+    """
+    header = parse_wav_header(data)
+    dtype = _wav_dtype(header)
+    if dtype is not None:
+        start, count = _wav_range(header, dtype, offset, duration)
+        y = _wav_samples(np.frombuffer(data, dtype=dtype, count=count, offset=start), header["channels"])
+        return resample(y, header["sr"], target_sr, resampler), target_sr
+    try:
+        y, sr = _soundfile_samples(io.BytesIO(data), offset, duration)
+    except (sf.LibsndfileError, RuntimeError):
+        # Formats libsndfile cannot read go through librosa's audioread fallback
+        with tempfile.NamedTemporaryFile(delete=False) as tmp:
+            tmp.write(data)
+        try:
+            return librosa.load(tmp.name, sr=target_sr, offset=offset, duration=duration)
+        finally:
+            os.remove(tmp.name)
+    return resample(y, sr, target_sr, resampler), target_sr
+
+
+def load_file(path, target_sr=TARGET_SR, offset=0.0, duration=None, resampler="auto", mmap_bytes=MMAP_BYTES):
+    """Decode an audio file to mono float32 at ``target_sr``.
+
+    Args:
+        path (str): Audio file.
+        target_sr (int): Output sample rate.
+        offset (float): Start of the range to read, in seconds.
+        duration (float): Length of the range; ``None`` reads to the end.
+        resampler (str): See ``resample``.
+        mmap_bytes (int): PCM16 / float32 WAV files of at least this size are
+                          memory-mapped, so only the requested range is paged in.
+
+    Returns:
+        tuple: ``(y, target_sr)``.
+    """
+    file_size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        header = parse_wav_header(f.read(HEADER_BYTES), file_size)
+        dtype = _wav_dtype(header)
+        if dtype is not None:
+            start, count = _wav_range(header, dtype, offset, duration)
+            if file_size >= mmap_bytes:
+                raw = np.memmap(f, dtype=dtype, mode="r", offset=start, shape=(count,))
+                y = np.array(_wav_samples(raw, header["channels"]), dtype=np.float32)  # detach from the map
+            else:
+                f.seek(start)
+                y = _wav_samples(np.fromfile(f, dtype=dtype, count=count), header["channels"])
+            return resample(y, header["sr"], target_sr, resampler), target_sr
+    try:
+        y, sr = _soundfile_samples(path, offset, duration)
+    except (sf.LibsndfileError, RuntimeError):
+        return librosa.load(path, sr=target_sr, offset=offset, duration=duration)
+    return resample(y, sr, target_sr, resampler), target_sr
@@ -0,0 +1,116 @@
+"""Benchmark of ``audio_io.load_file`` against ``librosa.load(path, sr=16000)``.
+
+Usage:
+    python bench_loader.py [--durations 5 60 600] [--repeat 5] [--resampler auto] [--out loader_bench.json]
+
+Writes speech-like test clips (``create_test_audio.make_speech_like``) in the
+formats uploads usually arrive in – 16 kHz mono PCM16 WAV, 44.1 kHz stereo
+PCM16 WAV, 48 kHz float WAV, 22.05 kHz FLAC – and reports per clip:
+
+* median decode time of both loaders over ``--repeat`` runs and the speed-up,
+* the agreement of the outputs (max absolute difference and SNR in dB of
+  ``load_file`` relative to ``librosa.load``; identical when no resampling is
+  needed or with the soxr resampler and librosa >= 0.10),
+* the time to read a 10 s range at the middle of the clip with ``offset`` /
+  ``duration``.
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import librosa
+import numpy as np
+import soundfile as sf
+
+from audio_io import RESAMPLERS, load_file
+from create_test_audio import make_speech_like
+
+SR = 16000
+FORMATS = {
+    # name: (sample rate, channels, extension, soundfile subtype)
+    "wav16k_mono_pcm16": (16000, 1, "wav", "PCM_16"),
+    "wav44k_stereo_pcm16": (44100, 2, "wav", "PCM_16"),
+    "wav48k_mono_float": (48000, 1, "wav", "FLOAT"),
+    "flac22k_mono": (22050, 1, "flac", "PCM_16"),
+}
+
+
+def write_clip(workdir, name, duration):
+    rate, channels, ext, subtype = FORMATS[name]
+    y = make_speech_like(duration, rate, seed=int(duration)).astype(np.float32)
+    if channels == 2:
+        y = np.stack([y, 0.5 * y], axis=1)
+    path = os.path.join(workdir, f"{name}_{duration:g}s.{ext}")
+    sf.write(path, y, rate, subtype=subtype)
+    return path
+
+
+def _median_time(fn, repeat):
+    fn()  # warm-up
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return float(np.median(times))
+
+
+def compare(path, duration, repeat, resampler):
+    reference, _ = librosa.load(path, sr=SR)
+    fast, _ = load_file(path, SR, resampler=resampler)
+    n = min(len(reference), len(fast))
+    error = fast[:n] - reference[:n]
+    noise = float(np.sum(error.astype(np.float64) ** 2))
+    signal_power = float(np.sum(reference[:n].astype(np.float64) ** 2))
+    offset = max(0.0, duration / 2 - 5)
+    librosa_s = _median_time(lambda: librosa.load(path, sr=SR), repeat)
+    load_file_s = _median_time(lambda: load_file(path, SR, resampler=resampler), repeat)
+    return {
+        "librosa_s": librosa_s,
+        "load_file_s": load_file_s,
+        "speedup": librosa_s / load_file_s if load_file_s > 0 else None,
+        "length_diff": int(len(fast) - len(reference)),
+        "max_abs_diff": float(np.max(np.abs(error))) if n else 0.0,
+        "snr_db": 10 * np.log10(signal_power / noise) if noise > 0 else None,
+        "range_librosa_s": _median_time(lambda: librosa.load(path, sr=SR, offset=offset, duration=10), repeat),
+        "range_load_file_s": _median_time(
+            lambda: load_file(path, SR, offset=offset, duration=10, resampler=resampler), repeat),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare audio_io.load_file with librosa.load.")
+    parser.add_argument("--durations", type=float, nargs="+", default=[5, 60, 600], help="Clip lengths in seconds")
+    parser.add_argument("--formats", nargs="+", choices=list(FORMATS), default=list(FORMATS))
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per loader (median reported)")
+    parser.add_argument("--resampler", choices=RESAMPLERS, default="auto", help="Resampler of load_file")
+    parser.add_argument("--out", help="Optional JSON report path")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="voice_loader_bench_")
+    header = f"{'clip':<28}{'librosa ms':>12}{'load_file ms':>14}{'speedup':>9}{'SNR dB':>8}{'10s range ms':>22}"
+    print(header)
+    print("-" * len(header))
+    report = {}
+    for duration in args.durations:
+        for name in args.formats:
+            path = write_clip(workdir, name, duration)
+            r = compare(path, duration, max(1, args.repeat), args.resampler)
+            report[f"{name}_{duration:g}s"] = r
+            snr = "exact" if r["snr_db"] is None else f"{r['snr_db']:.1f}"
+            print(f"{name + f'_{duration:g}s':<28}{r['librosa_s'] * 1000:>12.1f}{r['load_file_s'] * 1000:>14.1f}"
+                  f"{r['speedup']:>8.1f}x{snr:>8}"
+                  f"{r['range_librosa_s'] * 1000:>11.1f} ->{r['range_load_file_s'] * 1000:>8.1f}")
+            os.remove(path)
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report saved to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
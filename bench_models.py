@@ -0,0 +1,132 @@
+"""Accuracy-vs-speed report of the model backends against the fp32 models.
+
+Usage:
+    python bench_models.py [--audio a.wav b.wav] [--backend int8 onnx] [--out model_bench.json]
+
+Every backend analyses the same windows (1 s, 50 ms hop) of the given clips –
+by default ``test_audio.wav`` if present plus synthetic tones from
+create_test_audio. Reported per backend:
+
+* emotion / embedding time per window (median of ``--repeat`` runs) and the
+  speed-up over fp32,
+* top-1 emotion agreement with fp32 and the largest probability difference,
+* mean and minimum cosine similarity of the window embeddings to fp32.
+
+Export the int8 and ONNX models first with ``export_models.py``; int8 is
+quantised on the fly if it has not been exported.
+"""
+
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from create_test_audio import make_tone
+from voice_analysis import VoiceAnalyzer
+
+SR = 16000
+
+
+def _windows(audio_paths, analyzer):
+    windows = []
+    for path in audio_paths:
+        y, sr = analyzer.load_audio(path)
+        if y is not None:
+            for _, batch in analyzer._iter_window_batches(y, sr):
+                windows.append(np.array(batch))
+    for freq in (110, 220):
+        y = make_tone(4.0, SR, freq=freq, harmonics=(1.0, 0.5, 0.25), modulation_hz=3.0).astype(np.float32)
+        for _, batch in analyzer._iter_window_batches(y, SR):
+            windows.append(np.array(batch))
+    return np.concatenate(windows)
+
+
+def _timed(fn, batches, repeat):
+    fn(batches[0])  # warm-up
+    times, outputs = [], None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        outputs = [fn(batch) for batch in batches]
+        times.append(time.perf_counter() - start)
+    return float(np.median(times)), outputs
+
+
+def run_backend(backend, windows, batch_size, repeat):
+    analyzer = VoiceAnalyzer(batch_size=batch_size, model_backend=backend)
+    analyzer.warm_up(["emotion", "embedding"])
+    if not analyzer.models_available():
+        return None
+    batches = [windows[i:i + batch_size] for i in range(0, len(windows), batch_size)]
+    emo_time, emo = _timed(lambda b: analyzer.detect_emotion_batch(b, SR), batches, repeat)
+    emb_time, emb = _timed(lambda b: analyzer.extract_embeddings(b, SR), batches, repeat)
+    labels = analyzer.emotion_labels
+    probs = np.array([[r["probabilities"].get(label, 0.0) for label in labels] for batch in emo for r in batch])
+    return {
+        "emotion_s_per_window": emo_time / len(windows),
+        "embedding_s_per_window": emb_time / len(windows),
+        "probs": probs,
+        "embeddings": np.concatenate(emb),
+    }
+
+
+def compare(result, reference):
+    top1 = np.mean(np.argmax(result["probs"], axis=1) == np.argmax(reference["probs"], axis=1))
+    a, b = result["embeddings"], reference["embeddings"]
+    cosine = np.sum(a * b, axis=1) / (np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1) + 1e-12)
+    return {
+        "emotion_speedup": reference["emotion_s_per_window"] / result["emotion_s_per_window"],
+        "embedding_speedup": reference["embedding_s_per_window"] / result["embedding_s_per_window"],
+        "top1_agreement": float(top1),
+        "max_prob_diff": float(np.max(np.abs(result["probs"] - reference["probs"]))),
+        "embedding_cosine_mean": float(np.mean(cosine)),
+        "embedding_cosine_min": float(np.min(cosine)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare int8 / ONNX model backends with fp32.")
+    parser.add_argument("--audio", nargs="*", help="Clips to analyse (default: test_audio.wav if present)")
+    parser.add_argument("--backend", nargs="+", choices=["int8", "onnx"], default=["int8", "onnx"])
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per backend (median reported)")
+    parser.add_argument("--out", help="Optional JSON report path")
+    args = parser.parse_args()
+
+    audio = args.audio if args.audio is not None else [p for p in ["test_audio.wav"] if os.path.exists(p)]
+    windows = _windows(audio, VoiceAnalyzer())
+    print(f"{len(windows)} windows from {len(audio)} clips and 2 synthetic tones")
+
+    reference = run_backend("torch", windows, args.batch_size, args.repeat)
+    if reference is None:
+        print("fp32 models not available under models/ – nothing to compare against")
+        return
+    report = {"torch": {"emotion_s_per_window": reference["emotion_s_per_window"],
+                        "embedding_s_per_window": reference["embedding_s_per_window"]}}
+    for backend in args.backend:
+        result = run_backend(backend, windows, args.batch_size, args.repeat)
+        if result is None:
+            print(f"Skipping {backend}: models not available (run export_models.py)")
+            continue
+        report[backend] = {"emotion_s_per_window": result["emotion_s_per_window"],
+                           "embedding_s_per_window": result["embedding_s_per_window"],
+                           **compare(result, reference)}
+
+    header = f"{'backend':<8}{'emo ms/win':>11}{'emb ms/win':>11}{'speedup':>13}{'top1':>7}{'max dp':>8}{'cos min':>9}"
+    print(header)
+    print("-" * len(header))
+    for backend, r in report.items():
+        speedup = (f"{r['emotion_speedup']:.1f}x/{r['embedding_speedup']:.1f}x" if backend != "torch" else "1.0x/1.0x")
+        print(f"{backend:<8}{r['emotion_s_per_window'] * 1000:>11.2f}{r['embedding_s_per_window'] * 1000:>11.2f}"
+              f"{speedup:>13}{r.get('top1_agreement', 1.0):>7.2f}{r.get('max_prob_diff', 0.0):>8.3f}"
+              f"{r.get('embedding_cosine_min', 1.0):>9.3f}")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"windows": int(len(windows)), "clips": audio, "results": report}, f, indent=2)
+        print(f"Report saved to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
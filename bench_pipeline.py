@@ -0,0 +1,205 @@
+"""Per-stage benchmark of the VoiceAnalyzer pipeline.
+
+Usage:
+    python bench_pipeline.py [--durations 5 30 120] [--repeat 5] [--stand-in] [--out bench.json]
+    python bench_pipeline.py --compare bench_before.json bench_after.json
+
+Synthesises deterministic speech-like clips (``create_test_audio.make_speech_like``)
+of each duration and times every stage of the pipeline on its own:
+
+    load, noise_reduction, pitch, energy, breathing, emotion, asr, embedding,
+    clustering, cache_write, plus end_to_end (``analyze_audio`` on an empty cache)
+
+For each stage and clip it reports p50/p90/p99 latency over ``--repeat`` runs
+and throughput in audio-seconds per second; the peak RSS of the process is
+recorded after each clip. When the real checkpoints are missing from
+``models/`` (or with ``--stand-in``), small randomly initialised wav2vec2
+models of the same architecture stand in for them, so the timings exercise
+the same code paths at a fraction of the cost. ``--out`` writes the report as
+JSON (with the git commit); ``--compare`` prints the p50 change per stage
+between two such reports.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import soundfile as sf
+
+from analysis_cache import MemoryAnalysisCache, SQLiteAnalysisCache
+from audio_features import FeaturePlane
+from clustering import StreamingKMeans
+from create_test_audio import make_speech_like
+from timeline_format import encode_result
+from voice_analysis import VoiceAnalyzer, nr
+
+SR = 16000
+STAGES = ("load", "noise_reduction", "pitch", "energy", "breathing", "emotion", "asr", "embedding",
+          "clustering", "cache_write", "end_to_end")
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB (None where unsupported)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def use_stand_in_models(analyzer, workdir):
+    """Replace the analyzer's models with small random wav2vec2 models of the same kinds."""
+    import torch
+    from transformers import (Wav2Vec2Config, Wav2Vec2CTCTokenizer, Wav2Vec2FeatureExtractor,
+                              Wav2Vec2ForCTC, Wav2Vec2ForSequenceClassification, Wav2Vec2Model, pipeline)
+
+    def config(**kwargs):
+        return Wav2Vec2Config(hidden_size=64, num_hidden_layers=2, num_attention_heads=2, intermediate_size=128,
+                              conv_dim=(32,) * 7, num_conv_pos_embeddings=16, num_conv_pos_embedding_groups=4,
+                              classifier_proj_size=32, **kwargs)
+
+    torch.manual_seed(0)
+    analyzer.processor = Wav2Vec2FeatureExtractor(do_normalize=True)
+    analyzer.model = Wav2Vec2ForSequenceClassification(config(num_labels=len(analyzer.emotion_labels))).eval()
+    analyzer.embedding_processor = Wav2Vec2FeatureExtractor(do_normalize=True)
+    analyzer.embedding_model = Wav2Vec2Model(config()).eval()
+
+    vocab = {"<pad>": 0, "<s>": 1, "</s>": 2, "<unk>": 3, "|": 4}
+    vocab.update({c: i + 5 for i, c in enumerate("ABCDEFGHIJKLMNOPQRSTUVWXYZ'")})
+    vocab_path = os.path.join(workdir, "vocab.json")
+    with open(vocab_path, "w", encoding="utf-8") as f:
+        json.dump(vocab, f)
+    analyzer.asr = pipeline("automatic-speech-recognition",
+                            model=Wav2Vec2ForCTC(config(vocab_size=len(vocab))).eval(),
+                            tokenizer=Wav2Vec2CTCTokenizer(vocab_path),
+                            feature_extractor=Wav2Vec2FeatureExtractor(do_normalize=True), device=-1)
+
+
+def _windows(analyzer, y):
+    return np.concatenate([w for _, w in analyzer._iter_window_batches(y, SR)])
+
+
+def stage_functions(analyzer, y, path, workdir):
+    """``{stage: zero-argument callable}`` for one clip; each call runs the stage once."""
+    windows = _windows(analyzer, y)
+    batches = [windows[i:i + analyzer.batch_size] for i in range(0, len(windows), analyzer.batch_size)]
+    embeddings = np.concatenate([analyzer.extract_embeddings(b, SR) for b in batches])
+    result = analyzer.analyze_audio(path)
+    cache = SQLiteAnalysisCache(os.path.join(workdir, "bench_cache.sqlite3"))
+
+    def clustering():
+        clusterer = StreamingKMeans(n_clusters=3, pca_dim=analyzer.cluster_pca_dim)
+        for embedding in embeddings:
+            clusterer.add(embedding)
+        return clusterer.labels()
+
+    def end_to_end():
+        analyzer.cache = MemoryAnalysisCache()
+        return analyzer.analyze_audio(path)
+
+    return {
+        "load": lambda: analyzer.load_audio(path),
+        "noise_reduction": (lambda: nr.reduce_noise(y=y, sr=SR)) if nr is not None else None,
+        "pitch": lambda: analyzer.analyze_pitch(y, SR, plane=FeaturePlane(y, SR)),
+        "energy": lambda: analyzer.analyze_energy(y, SR, plane=FeaturePlane(y, SR)),
+        "breathing": lambda: analyzer.analyze_breathing(y, SR),
+        "emotion": lambda: [analyzer.detect_emotion_batch(b, SR) for b in batches],
+        "asr": (lambda: analyzer.transcribe_words(y, SR)) if analyzer.asr is not None else None,
+        "embedding": lambda: [analyzer.extract_embeddings(b, SR) for b in batches],
+        "clustering": clustering,
+        "cache_write": lambda: cache.set(f"bench:{len(y)}", encode_result(result, "base64")),
+        "end_to_end": end_to_end,
+    }
+
+
+def time_stage(fn, repeat):
+    fn()  # warm-up
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return np.array(times)
+
+
+def run(durations, repeat, stand_in, stages):
+    workdir = tempfile.mkdtemp(prefix="voice_bench_")
+    analyzer = VoiceAnalyzer(cache=MemoryAnalysisCache())
+    if stand_in or not analyzer.models_available():
+        print("Using stand-in models")
+        use_stand_in_models(analyzer, workdir)
+        stand_in = True
+    report = {"commit": git_commit(), "stand_in_models": stand_in, "repeat": repeat, "clips": {}}
+    for duration in durations:
+        y = make_speech_like(duration, SR, seed=int(duration)).astype(np.float32)
+        path = os.path.join(workdir, f"clip_{duration:g}s.wav")
+        sf.write(path, y, SR, subtype="PCM_16")
+        y, _ = analyzer.load_audio(path)
+        clip = {}
+        for stage, fn in stage_functions(analyzer, y, path, workdir).items():
+            if stage not in stages or fn is None:
+                continue
+            times = time_stage(fn, repeat)
+            clip[stage] = {
+                "p50_s": float(np.percentile(times, 50)),
+                "p90_s": float(np.percentile(times, 90)),
+                "p99_s": float(np.percentile(times, 99)),
+                "audio_s_per_s": float(duration / np.median(times)) if np.median(times) > 0 else None,
+            }
+            print(f"{duration:>7g}s {stage:<16}{clip[stage]['p50_s'] * 1000:>10.1f} ms p50"
+                  f"{clip[stage]['p99_s'] * 1000:>10.1f} ms p99{clip[stage]['audio_s_per_s'] or 0:>10.1f} audio-s/s")
+        report["clips"][f"{duration:g}"] = {"stages": clip, "peak_rss_mb": peak_rss_mb()}
+    return report
+
+
+def compare(before_path, after_path):
+    with open(before_path, "r", encoding="utf-8") as f:
+        before = json.load(f)
+    with open(after_path, "r", encoding="utf-8") as f:
+        after = json.load(f)
+    print(f"p50 latency: {before.get('commit')} -> {after.get('commit')}")
+    for duration, clip in after["clips"].items():
+        old_clip = before["clips"].get(duration, {}).get("stages", {})
+        for stage, r in clip["stages"].items():
+            if stage in old_clip:
+                old, new = old_clip[stage]["p50_s"], r["p50_s"]
+                print(f"{duration:>7}s {stage:<16}{old * 1000:>10.1f} ->{new * 1000:>10.1f} ms"
+                      f"{(new / old - 1) * 100 if old else 0:>+8.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-stage benchmark of the voice analysis pipeline.")
+    parser.add_argument("--durations", type=float, nargs="+", default=[5, 30, 120], help="Clip lengths in seconds")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per stage")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=list(STAGES))
+    parser.add_argument("--stand-in", action="store_true", help="Use small stand-in models even if real ones exist")
+    parser.add_argument("--out", help="Write the report as JSON")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="Compare two JSON reports")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+    report = run(args.durations, max(1, args.repeat), args.stand_in, set(args.stages))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report saved to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Benchmark the pitch backends of audio_features.FeaturePlane on synthetic tones.
+
+Usage:
+    python bench_pitch.py [--duration 10] [--repeat 3] [--out pitch_bench.json]
+
+For each test tone (pure sines and harmonic-rich tones from create_test_audio,
+with speech-like amplitude modulation) and each backend, reports wall time,
+peak traced memory, median absolute error in cents against the true f0, and
+the gross error rate (frames more than 50 cents off). The legacy
+``analyze_pitch`` behaviour – the mean of every nonzero candidate of the dense
+``librosa.piptrack`` matrix without fmin/fmax – is included as "piptrack_dense".
+"""
+
+import argparse
+import json
+import time
+import tracemalloc
+
+import librosa
+import numpy as np
+
+from audio_features import PITCH_BACKENDS, FeaturePlane
+from create_test_audio import make_tone
+
+SR = 16000
+FMIN, FMAX = 75, 400
+TONES = [
+    ("sine_110", 110, (1.0,)),
+    ("sine_220", 220, (1.0,)),
+    ("harmonic_95", 95, (1.0, 0.6, 0.4, 0.2)),
+    ("harmonic_180", 180, (1.0, 0.6, 0.4, 0.2)),
+    ("harmonic_310", 310, (0.4, 1.0, 0.3)),
+]
+
+
+def _run(backend, y):
+    if backend == "piptrack_dense":
+        pitches, _ = librosa.piptrack(y=y, sr=SR)
+        return pitches[pitches > 0]
+    plane = FeaturePlane(y, SR)
+    f0 = plane.f0(backend, FMIN, FMAX, min_rms=0.01)
+    return f0[f0 > 0]
+
+
+def bench(backend, y, true_f0, repeat):
+    _run(backend, y)  # warm-up (numba compilation, FFT plans)
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        values = _run(backend, y)
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    _run(backend, y)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    cents = np.abs(1200 * np.log2(values / true_f0)) if len(values) else np.array([np.inf])
+    return {
+        "time_s": float(np.median(times)),
+        "peak_mem_mb": peak / 2 ** 20,
+        "values": int(len(values)),
+        "mean_hz": float(np.mean(values)) if len(values) else 0.0,
+        "median_abs_error_cents": float(np.median(cents)),
+        "gross_error_rate": float(np.mean(cents > 50)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark pitch backends on synthetic tones.")
+    parser.add_argument("--duration", type=float, default=10.0, help="Tone length in seconds")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per backend (median reported)")
+    parser.add_argument("--out", help="Optional JSON report path")
+    args = parser.parse_args()
+
+    backends = list(PITCH_BACKENDS) + ["piptrack_dense"]
+    report = {}
+    for name, freq, harmonics in TONES:
+        y = make_tone(args.duration, SR, freq=freq, harmonics=harmonics).astype(np.float32)
+        report[name] = {backend: bench(backend, y, freq, args.repeat) for backend in backends}
+
+    header = f"{'tone':<14}{'backend':<16}{'time ms':>9}{'peak MB':>9}{'mean Hz':>9}{'MAE ct':>9}{'gross':>7}"
+    print(header)
+    print("-" * len(header))
+    for name, results in report.items():
+        for backend, r in results.items():
+            print(f"{name:<14}{backend:<16}{r['time_s'] * 1000:>9.1f}{r['peak_mem_mb']:>9.1f}"
+                  f"{r['mean_hz']:>9.1f}{r['median_abs_error_cents']:>9.1f}{r['gross_error_rate']:>7.2f}")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"duration_s": args.duration, "results": report}, f, indent=2)
+        print(f"Report saved to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
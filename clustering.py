@@ -0,0 +1,104 @@
+"""Incremental clustering of window embeddings.
+
+``StreamingKMeans`` clusters embeddings as the windows are analysed:
+
+* the first ``warmup`` embeddings are buffered; clips that never get past the
+  warmup are clustered with an exact ``KMeans`` fit;
+* past the warmup, an optional PCA (fitted on the warmup buffer) reduces each
+  embedding to ``pca_dim`` values and ``MiniBatchKMeans.partial_fit`` updates
+  the centroids batch by batch;
+* each batch is labelled against the centroids right after its update and only
+  the labels (one byte per embedding) are kept, so memory does not grow with
+  the embedding size. Early batches are therefore labelled against earlier
+  centroids than the final ones.
+
+Example:
+    clusterer = StreamingKMeans(n_clusters=3, pca_dim=32)
+    for batch in embedding_batches:
+        clusterer.add(batch)
+    labels = clusterer.labels()
+"""
+
+import numpy as np
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from sklearn.decomposition import PCA
+
+
+class StreamingKMeans:
+    """Online k-means with bounded memory.
+
+    Args:
+        n_clusters (int): Number of clusters (fewer if fewer points are seen).
+        pca_dim (int): Reduce embeddings to this many dimensions before
+                       clustering; ``None`` clusters them as they are.
+        warmup (int): Embeddings buffered before switching to mini-batch updates;
+                      at most this many full-size embeddings are held.
+        batch_size (int): Embeddings per ``partial_fit`` call after the warmup.
+        random_state (int): Seed for the initialisation.
+    """
+
+    def __init__(self, n_clusters=3, pca_dim=None, warmup=2048, batch_size=1024, random_state=0):
+        self.n_clusters = n_clusters
+        self.pca_dim = pca_dim
+        self.warmup = max(int(warmup), n_clusters)
+        self.batch_size = max(int(batch_size), n_clusters)
+        self.random_state = random_state
+        self.n_seen = 0
+        self._buffer = []    # raw embeddings, until the warmup is over
+        self._pending = []   # reduced embeddings waiting for the next partial_fit
+        self._labels = []    # int8 label blocks of the embeddings clustered so far
+        self._pca = None
+        self._kmeans = None
+
+    def add(self, embeddings):
+        """Add one embedding or a ``[n, dim]`` batch of them."""
+        embeddings = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+        if len(embeddings) == 0:
+            return
+        self.n_seen += len(embeddings)
+        if self._kmeans is None:
+            self._buffer.append(embeddings)
+            if self.n_seen >= self.warmup:
+                self._start_streaming()
+            return
+        self._pending.append(self._reduce(embeddings))
+        if sum(len(p) for p in self._pending) >= self.batch_size:
+            self._flush()
+
+    def labels(self):
+        """Cluster label of every embedding added so far, in order."""
+        if self.n_seen == 0:
+            return []
+        if self._kmeans is None:
+            # Short clip: exact batch k-means
+            points = np.concatenate(self._buffer)
+            if self.pca_dim is not None and self.pca_dim < min(points.shape):
+                points = PCA(n_components=self.pca_dim, random_state=self.random_state).fit_transform(points)
+            k = min(self.n_clusters, len(points))
+            return KMeans(n_clusters=k, random_state=self.random_state).fit_predict(points).tolist()
+        self._flush()
+        return np.concatenate(self._labels).tolist()
+
+    def _reduce(self, embeddings):
+        if self._pca is None:
+            return embeddings
+        return self._pca.transform(embeddings).astype(np.float32)
+
+    def _start_streaming(self):
+        points = np.concatenate(self._buffer)
+        self._buffer = []
+        if self.pca_dim is not None and self.pca_dim < min(points.shape):
+            self._pca = PCA(n_components=self.pca_dim, random_state=self.random_state).fit(points)
+        reduced = self._reduce(points)
+        self._kmeans = MiniBatchKMeans(n_clusters=self.n_clusters, random_state=self.random_state,
+                                       batch_size=self.batch_size, n_init=3)
+        self._fit_block(reduced)
+
+    def _flush(self):
+        if self._pending:
+            self._fit_block(np.concatenate(self._pending))
+            self._pending = []
+
+    def _fit_block(self, block):
+        self._kmeans.partial_fit(block)
+        self._labels.append(self._kmeans.predict(block).astype(np.int8))
@@ -0,0 +1,94 @@
+"""Compare frame-level ("shared encoder") window outputs with the exact per-window path.
+
+Usage:
+    python compare_frame_mode.py --audio test_audio.wav [--out frame_mode_report.json]
+
+Both paths are run on the same pre-processed clip (noise reduction and peak
+normalisation as in ``VoiceAnalyzer.analyze_audio``). The report lists, per clip,
+how often the per-window emotion labels agree, how far the emotion probabilities
+and confidences drift, how similar the window embeddings are (cosine) and how long
+each path took.
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+from voice_analysis import VoiceAnalyzer, nr
+
+
+def compare(analyzer, y, sr):
+    t0 = time.perf_counter()
+    exact_emotions, exact_embeddings = analyzer._analyze_windows_batched(y, sr)
+    exact_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    frame_emotions, frame_embeddings = analyzer._analyze_windows_frame_level(y, sr)
+    frame_s = time.perf_counter() - t0
+
+    n = len(exact_emotions)
+    if n == 0:
+        return {"windows": 0, "exact_s": exact_s, "frame_s": frame_s}
+
+    label_agreement = np.mean([a["emotion"] == b["emotion"] for a, b in zip(exact_emotions, frame_emotions)])
+    conf_diff = np.abs([a["confidence"] - b["confidence"] for a, b in zip(exact_emotions, frame_emotions)])
+    prob_diff = np.abs([
+        [a["probabilities"].get(label, 0.0) - b["probabilities"].get(label, 0.0) for label in analyzer.emotion_labels]
+        for a, b in zip(exact_emotions, frame_emotions)
+    ])
+    exact_emb = np.asarray(exact_embeddings, dtype=np.float64)
+    frame_emb = np.asarray(frame_embeddings, dtype=np.float64)
+    cosine = np.sum(exact_emb * frame_emb, axis=1) / (
+        np.linalg.norm(exact_emb, axis=1) * np.linalg.norm(frame_emb, axis=1) + 1e-12
+    )
+
+    return {
+        "windows": n,
+        "duration_s": len(y) / sr,
+        "label_agreement": float(label_agreement),
+        "confidence_abs_diff_mean": float(np.mean(conf_diff)),
+        "confidence_abs_diff_max": float(np.max(conf_diff)),
+        "probability_abs_diff_mean": float(np.mean(prob_diff)),
+        "probability_abs_diff_max": float(np.max(prob_diff)),
+        "embedding_cosine_mean": float(np.mean(cosine)),
+        "embedding_cosine_min": float(np.min(cosine)),
+        "exact_s": exact_s,
+        "frame_s": frame_s,
+        "speedup": exact_s / frame_s if frame_s > 0 else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare frame-level and exact per-window analysis.")
+    parser.add_argument("--audio", nargs="+", default=["test_audio.wav"], help="Audio file(s) to compare on")
+    parser.add_argument("--out", help="Optional JSON report path")
+    args = parser.parse_args()
+
+    analyzer = VoiceAnalyzer()
+    if analyzer.model is None or analyzer.embedding_model is None:
+        print("Emotion and embedding models are required for this comparison (see models/).")
+        return
+
+    report = {}
+    for audio_path in args.audio:
+        y, sr = analyzer.load_audio(audio_path)
+        if y is None:
+            continue
+        if nr is not None:
+            y = nr.reduce_noise(y=y, sr=sr)
+        if np.max(np.abs(y)) > 0:
+            y = y / np.max(np.abs(y))
+        report[audio_path] = compare(analyzer, y, sr)
+        print(f"{audio_path}: " + ", ".join(f"{k}={v:.4g}" if isinstance(v, float) else f"{k}={v}"
+                                           for k, v in report[audio_path].items()))
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report saved to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,14 +5,47 @@ import numpy as np
 import soundfile as sf
 import os
 
-def create_test_audio(filename, duration=5, sample_rate=16000):
-    """Create a simple test audio file with a sine wave."""
+def make_tone(duration=5, sample_rate=16000, freq=440, harmonics=(1.0,), modulation_hz=2):
+    """Synthesise an amplitude-modulated tone as a float array in [-0.5, 0.5].
+
+    Args:
+        freq (float): Fundamental frequency in Hz.
+        harmonics (sequence): Relative amplitude of the fundamental and each overtone.
+        modulation_hz (float): Rate of the speech-like amplitude modulation (0 disables it).
+    """
     t = np.linspace(0, duration, int(sample_rate * duration), False)
-    # Generate a 440 Hz sine wave
-    tone = np.sin(2 * np.pi * 440 * t) * 0.5
+    tone = sum(a * np.sin(2 * np.pi * freq * (k + 1) * t) for k, a in enumerate(harmonics))
+    tone = tone / np.max(np.abs(tone)) * 0.5
     
     # Add some amplitude modulation to simulate speech-like characteristics
-    tone *= (0.5 + 0.5 * np.sin(2 * np.pi * 2 * t))  # 2 Hz modulation
+    if modulation_hz:
+        tone *= (0.5 + 0.5 * np.sin(2 * np.pi * modulation_hz * t))
+    return tone
+
+def make_speech_like(duration=10, sample_rate=16000, seed=0, pause_ratio=0.3):
+    """Deterministic speech-like clip: harmonic tone "phrases" of varying pitch and
+    length separated by pauses, over faint noise. Same ``seed``, same samples.
+
+    Args:
+        pause_ratio (float): Approximate fraction of the clip that is silent.
+    """
+    rng = np.random.default_rng(seed)
+    n = int(sample_rate * duration)
+    out = np.zeros(n)
+    pos = 0
+    while pos < n:
+        phrase = int(sample_rate * rng.uniform(0.5, 2.5))
+        tone = make_tone(phrase / sample_rate, sample_rate, freq=rng.uniform(90, 260),
+                         harmonics=(1.0, 0.6, 0.3, 0.15), modulation_hz=rng.uniform(2, 6))
+        end = min(n, pos + len(tone))
+        out[pos:end] = tone[:end - pos]
+        pos = end + int(phrase * pause_ratio / (1 - pause_ratio) * rng.uniform(0.5, 1.5))
+    return out + 0.003 * rng.standard_normal(n)
+
+def create_test_audio(filename, duration=5, sample_rate=16000):
+    """Create a simple test audio file with a sine wave."""
+    # Generate a 440 Hz sine wave
+    tone = make_tone(duration, sample_rate, freq=440)
     
     # Convert to 16-bit PCM format
     audio_int16 = (tone * 32767).astype(np.int16)
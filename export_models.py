@@ -0,0 +1,91 @@
+"""Export CPU-optimised variants of the emotion and embedding models.
+
+Usage:
+    python export_models.py [--backend int8 onnx] [--models emotion embedding]
+
+Reads the fp32 models from ``models/`` and writes, next to each of them:
+
+* ``<model>-int8/`` – config, feature extractor and ``model_int8.pt``: the state
+  dict of the model with every ``nn.Linear`` dynamically quantised to int8.
+* ``<model>-onnx/`` – feature extractor and ``model.onnx``: the model traced to
+  ONNX (input ``input_values`` of shape ``[batch, samples]``, output ``logits``
+  or ``last_hidden_state``), with dynamic batch and length axes.
+
+Select them with ``VoiceAnalyzer(model_backend="int8")`` or ``"onnx"``, and
+compare them with the fp32 models using ``bench_models.py``. The ASR pipeline
+is quantised on the fly when the int8 backend loads it and is not exported.
+"""
+
+import argparse
+import os
+
+import torch
+
+import model_registry
+from model_registry import INT8_WEIGHTS, ONNX_MODEL, backend_path, quantize_int8
+
+EXPORTS = {
+    # name: (fp32 loader, path attribute in model_registry, ONNX output name)
+    "emotion": (model_registry._load_emotion_model, "EMOTION_MODEL_PATH", "logits"),
+    "embedding": (model_registry._load_embedding_model, "EMBEDDING_MODEL_PATH", "last_hidden_state"),
+}
+
+
+class _OutputOnly(torch.nn.Module):
+    """Wraps a transformers model so tracing sees a single tensor output."""
+
+    def __init__(self, model, output_name):
+        super().__init__()
+        self.model = model
+        self.output_name = output_name
+
+    def forward(self, input_values):
+        return getattr(self.model(input_values=input_values), self.output_name)
+
+
+def export_int8(processor, model, out_dir):
+    os.makedirs(out_dir, exist_ok=True)
+    quantized = quantize_int8(model)
+    processor.save_pretrained(out_dir)
+    model.config.save_pretrained(out_dir)
+    torch.save(quantized.state_dict(), os.path.join(out_dir, INT8_WEIGHTS))
+
+
+def export_onnx(processor, model, out_dir, output_name, opset=17):
+    os.makedirs(out_dir, exist_ok=True)
+    processor.save_pretrained(out_dir)
+    dummy = torch.zeros(2, 16000)
+    with torch.no_grad():
+        torch.onnx.export(
+            _OutputOnly(model.cpu().eval(), output_name), (dummy,), os.path.join(out_dir, ONNX_MODEL),
+            input_names=["input_values"], output_names=[output_name],
+            dynamic_axes={"input_values": {0: "batch", 1: "samples"}, output_name: {0: "batch"}},
+            opset_version=opset, dynamo=False,
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export int8 / ONNX variants of the voice models.")
+    parser.add_argument("--backend", nargs="+", choices=["int8", "onnx"], default=["int8", "onnx"])
+    parser.add_argument("--models", nargs="+", choices=list(EXPORTS), default=list(EXPORTS))
+    args = parser.parse_args()
+
+    for name in args.models:
+        loader, path_attr, output_name = EXPORTS[name]
+        model_path = getattr(model_registry, path_attr)
+        if not os.path.exists(model_path):
+            print(f"Skipping {name}: {model_path} not found")
+            continue
+        for backend in args.backend:
+            processor, model = loader("cpu")  # fresh copy: quantisation and tracing modify the model
+            out_dir = backend_path(model_path, backend)
+            if backend == "int8":
+                export_int8(processor, model, out_dir)
+            else:
+                export_onnx(processor, model, out_dir, output_name)
+            size_mb = sum(os.path.getsize(os.path.join(out_dir, f)) for f in os.listdir(out_dir)) / 2 ** 20
+            print(f"Exported {name} ({backend}) to {out_dir} ({size_mb:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+"""Buffered, asynchronous writes of analysis results to Firebase.
+
+``FirebaseWriter`` assigns the push key locally, buffers results and flushes
+them from a background thread as multi-path ``update()`` calls once
+``max_batch`` results are waiting or ``flush_interval_s`` has passed, retrying
+failed flushes with exponential backoff. Call ``close`` before exiting so
+buffered results are written.
+
+The per-window ``timeline`` (20 entries per second) can be written in full,
+downsampled, moved to a separate node (``users/<uid>/voice_timelines/<key>``)
+so the analysis documents stay small, or dropped.
+
+``LocalReference`` is an in-memory stand-in for ``firebase_admin.db.Reference``
+(``child``/``get``/``set``/``update``/``push``) for tests and local runs:
+
+    root = LocalReference()
+    writer = FirebaseWriter(root=root, timeline="separate")
+    key = writer.submit("user1", results)
+    writer.flush()
+    root.child(f"users/user1/voice_analyses/{key}").get()
+"""
+
+import copy
+import logging
+import random
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+PUSH_CHARS = "-0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ_abcdefghijklmnopqrstuvwxyz"
+TIMELINE_MODES = ("full", "downsample", "separate", "none")
+
+
+class FirebaseNotConfigured(RuntimeError):
+    """Raised when the writer has no root reference and Firebase cannot be initialised."""
+
+_push_lock = threading.Lock()
+_last_push_ms = 0
+_last_push_rand = []
+
+
+def push_id():
+    """Generate a Firebase-style push key (chronologically sortable, 20 characters) locally."""
+    global _last_push_ms, _last_push_rand
+    with _push_lock:
+        now = int(time.time() * 1000)
+        if now == _last_push_ms:
+            # Same millisecond: increment the random part so keys stay ordered
+            for i in range(11, -1, -1):
+                if _last_push_rand[i] != 63:
+                    _last_push_rand[i] += 1
+                    break
+                _last_push_rand[i] = 0
+        else:
+            _last_push_ms = now
+            _last_push_rand = [random.randrange(64) for _ in range(12)]
+        time_chars = []
+        for _ in range(8):
+            time_chars.append(PUSH_CHARS[now % 64])
+            now //= 64
+        return "".join(reversed(time_chars)) + "".join(PUSH_CHARS[i] for i in _last_push_rand)
+
+
+class LocalReference:
+    """In-memory fake of the ``firebase_admin.db.Reference`` API.
+
+    Args:
+        fail_updates (int): Number of ``update`` calls that raise ``ConnectionError``
+                            before succeeding, to exercise retry logic.
+    """
+
+    def __init__(self, path="/", _store=None, fail_updates=0):
+        self.path = "/" + path.strip("/")
+        self._store = _store if _store is not None else {"root": {}, "fail_updates": fail_updates, "updates": 0}
+
+    @property
+    def key(self):
+        return self.path.rstrip("/").rsplit("/", 1)[-1] or None
+
+    def _parts(self):
+        return [p for p in self.path.split("/") if p]
+
+    def child(self, path):
+        return LocalReference(self.path.rstrip("/") + "/" + path.strip("/"), self._store)
+
+    def get(self):
+        node = self._store["root"]
+        for part in self._parts():
+            if not isinstance(node, dict) or part not in node:
+                return None
+            node = node[part]
+        return copy.deepcopy(node)
+
+    def set(self, value):
+        parts = self._parts()
+        if not parts:
+            self._store["root"] = copy.deepcopy(value)
+            return
+        node = self._store["root"]
+        for part in parts[:-1]:
+            node = node.setdefault(part, {})
+        node[parts[-1]] = copy.deepcopy(value)
+
+    def update(self, value):
+        self._store["updates"] += 1
+        if self._store["fail_updates"] > 0:
+            self._store["fail_updates"] -= 1
+            raise ConnectionError("Simulated network failure")
+        for path, item in value.items():
+            self.child(path).set(item)
+
+    def push(self, value=""):
+        ref = self.child(push_id())
+        ref.set(value)
+        return ref
+
+    @property
+    def update_calls(self):
+        return self._store["updates"]
+
+
+def downsample_timeline(timeline, step_s):
+    """Keep the first timeline entry of every ``step_s`` interval."""
+    kept, last_bucket = [], None
+    for entry in timeline:
+        bucket = int(entry.get("start", 0.0) // step_s)
+        if bucket != last_bucket:
+            kept.append(entry)
+            last_bucket = bucket
+    return kept
+
+
+class FirebaseWriter:
+    """Background writer that batches analysis results into multi-path updates.
+
+    Args:
+        root: Root database reference; defaults to ``firebase_admin.db.reference("/")``
+              (initialising Firebase on first flush).
+        max_batch (int): Flush as soon as this many results are buffered.
+        flush_interval_s (float): Flush buffered results at least this often.
+        max_retries (int): Retries per batch before the batch is dropped.
+        backoff_s (float): Initial retry delay, doubled on every attempt.
+        timeline (str): "full", "downsample", "separate" or "none".
+        timeline_step_s (float): Entry spacing kept by the "downsample" mode.
+    """
+
+    def __init__(self, root=None, max_batch=50, flush_interval_s=2.0, max_retries=5, backoff_s=0.5,
+                 timeline="full", timeline_step_s=1.0):
+        if timeline not in TIMELINE_MODES:
+            raise ValueError(f"Unknown timeline mode: {timeline}")
+        self._root = root
+        self.max_batch = max(1, int(max_batch))
+        self.flush_interval_s = flush_interval_s
+        self.max_retries = max_retries
+        self.backoff_s = backoff_s
+        self.timeline = timeline
+        self.timeline_step_s = timeline_step_s
+
+        self._pending = {}
+        self._pending_results = 0
+        self._in_flight = 0
+        self._closing = False
+        self._flush_requested = False
+        self._cond = threading.Condition()
+        self._stats = {"submitted": 0, "written": 0, "dropped": 0, "batches": 0, "retries": 0}
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, user_id, analysis_results):
+        """Buffer one analysis for ``user_id`` and return its push key immediately.
+
+        Returns ``None`` without buffering anything when Firebase is not configured.
+        """
+        try:
+            self._root_ref()
+        except FirebaseNotConfigured:
+            return None
+        key = push_id()
+        updates = self._paths(user_id, key, analysis_results)
+        with self._cond:
+            self._pending.update(updates)
+            self._pending_results += 1
+            self._stats["submitted"] += 1
+            if self._pending_results >= self.max_batch:
+                self._cond.notify_all()
+        return key
+
+    def flush(self, timeout=None):
+        """Write everything buffered so far and wait until it has been written (or dropped)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._flush_requested = True
+            self._cond.notify_all()
+            while self._pending_results or self._in_flight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining if remaining is not None else 0.1)
+        return True
+
+    def close(self, timeout=None):
+        self.flush(timeout)
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+
+    def stats(self):
+        with self._cond:
+            return dict(self._stats, pending=self._pending_results)
+
+    def _paths(self, user_id, key, analysis_results):
+        base = f"users/{user_id}/voice_analyses/{key}"
+        result = dict(analysis_results)
+        timeline = result.get("timeline")
+        if timeline is None or self.timeline == "full":
+            return {base: result}
+        if self.timeline == "downsample":
+            result["timeline"] = downsample_timeline(timeline, self.timeline_step_s)
+            return {base: result}
+        del result["timeline"]
+        if self.timeline == "separate":
+            timeline_path = f"users/{user_id}/voice_timelines/{key}"
+            result["timeline_ref"] = timeline_path
+            return {base: result, timeline_path: timeline}
+        return {base: result}
+
+    def _root_ref(self):
+        if self._root is None:
+            from firebase_admin import db
+            from voice_analysis import init_firebase
+
+            if not init_firebase():
+                raise FirebaseNotConfigured("Firebase is not configured")
+            self._root = db.reference("/")
+        return self._root
+
+    def _run(self):
+        while True:
+            with self._cond:
+                deadline = time.monotonic() + self.flush_interval_s
+                while (not self._closing and not self._flush_requested
+                       and self._pending_results < self.max_batch):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                if self._closing and not self._pending_results:
+                    return
+                self._flush_requested = False
+                batch, count = self._pending, self._pending_results
+                self._pending, self._pending_results = {}, 0
+                self._in_flight = count
+            if batch:
+                self._write(batch, count)
+            with self._cond:
+                self._in_flight = 0
+                self._cond.notify_all()
+
+    def _write(self, batch, count):
+        for attempt in range(self.max_retries + 1):
+            try:
+                self._root_ref().update(batch)
+                with self._cond:
+                    self._stats["written"] += count
+                    self._stats["batches"] += 1
+                return
+            except Exception as e:
+                if isinstance(e, FirebaseNotConfigured) or attempt == self.max_retries:
+                    logger.error(f"Dropping {count} Firebase writes after {attempt + 1} attempts: {e}")
+                    with self._cond:
+                        self._stats["dropped"] += count
+                    return
+                delay = self.backoff_s * 2 ** attempt
+                logger.warning(f"Firebase batch write failed ({e}); retrying in {delay:.1f}s")
+                with self._cond:
+                    self._stats["retries"] += 1
+                time.sleep(delay)
@@ -0,0 +1,262 @@
+"""Process-wide registry of lazily loaded models.
+
+Models are registered by name and loaded on first use; the loaded objects are
+shared by every analyzer in the process.
+
+Each model is registered once per backend (see ``MODEL_BACKENDS``):
+
+* ``"torch"`` – the full-precision transformers models (``"emotion"``, ...).
+* ``"int8"`` – the same models with dynamically quantised int8 ``nn.Linear``
+  layers (``"emotion-int8"``, ...). Loaded from the ``*-int8`` directories that
+  ``export_models.py`` writes, or quantised on the fly from the fp32 weights.
+* ``"onnx"`` – ONNX Runtime sessions over the graphs ``export_models.py`` writes
+  to the ``*-onnx`` directories (``"emotion-onnx"``, ``"embedding-onnx"``); ASR
+  has no ONNX export and uses its int8 variant.
+
+Example:
+    from model_registry import registry
+
+    registry.warm_up(["emotion", "embedding"], device="cpu")
+    processor, model = registry.get("emotion", device="cpu")
+    print(registry.load_times())
+"""
+
+import logging
+import os
+import threading
+import time
+from types import SimpleNamespace
+
+logger = logging.getLogger(__name__)
+
+MODELS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models")
+
+EMOTION_MODEL_NAME = "superb/wav2vec2-base-superb-er"
+EMBEDDING_MODEL_NAME = "facebook/wav2vec2-large-960h"
+ASR_MODEL_NAME = "facebook/wav2vec2-base-960h"
+
+EMOTION_MODEL_PATH = os.path.join(MODELS_DIR, "wav2vec2-base-superb-er")
+EMBEDDING_MODEL_PATH = os.path.join(MODELS_DIR, "wav2vec2-large-960h")
+
+MODEL_BACKENDS = ("torch", "int8", "onnx")
+INT8_WEIGHTS = "model_int8.pt"
+ONNX_MODEL = "model.onnx"
+
+
+def backend_path(model_path, backend):
+    """Directory holding the ``backend`` export of the model at ``model_path``."""
+    return model_path if backend == "torch" else f"{model_path}-{backend}"
+
+
+def model_key(name, backend="torch"):
+    """Registry name of model ``name`` for ``backend``."""
+    if backend == "onnx" and name == "asr":
+        backend = "int8"
+    return name if backend == "torch" else f"{name}-{backend}"
+
+
+class ModelRegistry:
+    """Loads each registered model once per (name, device) and shares it."""
+
+    def __init__(self):
+        self._loaders = {}
+        self._available = {}
+        self._models = {}
+        self._errors = {}
+        self._load_times = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, loader, available=None):
+        """Register ``loader(device)`` under ``name``.
+
+        Args:
+            name (str): Model name used with ``get``.
+            loader (callable): Builds the model for a device; may raise on failure.
+            available (callable): Optional cheap check (e.g. weights exist on disk)
+                                  used to decide whether loading is worth trying.
+        """
+        self._loaders[name] = loader
+        self._available[name] = available
+
+    def available(self, name, device="cpu"):
+        """Whether ``name`` is loaded or can be expected to load, without loading it."""
+        key = (name, device)
+        if key in self._models:
+            return self._models[key] is not None
+        if key in self._errors:
+            return False
+        check = self._available.get(name)
+        return name in self._loaders and (check is None or check())
+
+    def failed(self, name, device="cpu"):
+        return (name, device) in self._errors
+
+    def is_loaded(self, name, device="cpu"):
+        return self._models.get((name, device)) is not None
+
+    def get(self, name, device="cpu"):
+        """Return the model for ``name``, loading it on first use.
+
+        Returns ``None`` if the model is unavailable or failed to load; failures are
+        remembered so later calls do not retry (use ``unload`` to allow a retry).
+        """
+        key = (name, device)
+        if key in self._models:
+            return self._models[key]
+        with self._lock:
+            lock = self._locks.setdefault(key, threading.Lock())
+        with lock:
+            if key in self._models:
+                return self._models[key]
+            model = None
+            if name not in self._loaders:
+                logger.error(f"No model registered under '{name}'")
+            elif not self.available(name, device):
+                logger.warning(f"Model '{name}' is not available. Some features will be disabled.")
+            else:
+                start = time.perf_counter()
+                try:
+                    model = self._loaders[name](device)
+                    self._load_times[name] = time.perf_counter() - start
+                    logger.info(f"Loaded model '{name}' on {device} in {self._load_times[name]:.2f}s")
+                except Exception as e:
+                    self._errors[key] = str(e)
+                    logger.error(f"Failed to load model '{name}': {str(e)}")
+            self._models[key] = model
+            return model
+
+    def warm_up(self, names=None, device="cpu"):
+        """Load ``names`` (default: every registered model) now and return their load times."""
+        for name in names or list(self._loaders):
+            self.get(name, device)
+        return self.load_times()
+
+    def unload(self, name, device="cpu"):
+        with self._lock:
+            self._models.pop((name, device), None)
+            self._errors.pop((name, device), None)
+
+    def load_times(self):
+        """Seconds spent loading each model, keyed by name."""
+        return dict(self._load_times)
+
+
+def _load_emotion_model(device):
+    from transformers import Wav2Vec2FeatureExtractor, Wav2Vec2ForSequenceClassification
+
+    logger.info(f"Loading emotion model from local: {EMOTION_MODEL_PATH}")
+    processor = Wav2Vec2FeatureExtractor.from_pretrained(EMOTION_MODEL_PATH)
+    model = Wav2Vec2ForSequenceClassification.from_pretrained(EMOTION_MODEL_PATH, local_files_only=True).to(device)
+    model.eval()
+    return processor, model
+
+
+def _load_embedding_model(device):
+    from transformers import Wav2Vec2FeatureExtractor, Wav2Vec2Model
+
+    logger.info(f"Loading embedding model from local: {EMBEDDING_MODEL_PATH}")
+    processor = Wav2Vec2FeatureExtractor.from_pretrained(EMBEDDING_MODEL_PATH)
+    model = Wav2Vec2Model.from_pretrained(EMBEDDING_MODEL_PATH, local_files_only=True).to(device)
+    model.eval()
+    return processor, model
+
+
+def _load_asr(device):
+    from transformers import pipeline
+
+    return pipeline("automatic-speech-recognition", model=ASR_MODEL_NAME, device=0 if device == 'cuda' else -1)
+
+
+def quantize_int8(model):
+    """Dynamically quantise the ``nn.Linear`` layers of ``model`` to int8 (CPU only)."""
+    import torch
+
+    return torch.quantization.quantize_dynamic(model.cpu(), {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def _int8_loader(model_path, model_class, fp32_loader):
+    def load(device):
+        import transformers
+
+        cls = getattr(transformers, model_class)
+        int8_path = backend_path(model_path(), "int8")
+        weights = os.path.join(int8_path, INT8_WEIGHTS)
+        if not os.path.exists(weights):
+            logger.info(f"No int8 export in {int8_path}; quantising the fp32 model")
+            processor, model = fp32_loader("cpu")
+            return processor, quantize_int8(model).eval()
+        import torch
+
+        logger.info(f"Loading int8 model from local: {int8_path}")
+        processor = transformers.Wav2Vec2FeatureExtractor.from_pretrained(int8_path)
+        config = transformers.AutoConfig.from_pretrained(int8_path)
+        model = quantize_int8(cls(config))
+        model.load_state_dict(torch.load(weights, map_location="cpu"))
+        return processor, model.eval()
+    return load
+
+
+class OnnxModel:
+    """ONNX Runtime session called like the transformers model it was exported from.
+
+    Only the inputs the graph declares are fed (the exports take ``input_values``
+    alone: windows in a batch have equal length, so there is no padding mask) and
+    the single output is returned as a torch tensor attribute, e.g. ``.logits``.
+    """
+
+    def __init__(self, path, output_name, num_threads=None):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.output_name = output_name
+
+    def __call__(self, **inputs):
+        import torch
+
+        feed = {k: v.cpu().numpy() for k, v in inputs.items() if k in self.input_names}
+        output = self.session.run([self.output_name], feed)[0]
+        return SimpleNamespace(**{self.output_name: torch.from_numpy(output)})
+
+
+def _onnx_loader(model_path, output_name):
+    def load(device):
+        from transformers import Wav2Vec2FeatureExtractor
+
+        onnx_path = backend_path(model_path(), "onnx")
+        logger.info(f"Loading ONNX model from local: {onnx_path}")
+        processor = Wav2Vec2FeatureExtractor.from_pretrained(onnx_path)
+        return processor, OnnxModel(os.path.join(onnx_path, ONNX_MODEL), output_name)
+    return load
+
+
+def _load_asr_int8(device):
+    asr = _load_asr("cpu")
+    asr.model = quantize_int8(asr.model).eval()
+    return asr
+
+
+registry = ModelRegistry()
+registry.register("emotion", _load_emotion_model, available=lambda: os.path.exists(EMOTION_MODEL_PATH))
+registry.register("embedding", _load_embedding_model, available=lambda: os.path.exists(EMBEDDING_MODEL_PATH))
+registry.register("asr", _load_asr)
+
+# Paths are looked up at load time so they can be pointed elsewhere before first use
+registry.register("emotion-int8",
+                  _int8_loader(lambda: EMOTION_MODEL_PATH, "Wav2Vec2ForSequenceClassification", _load_emotion_model),
+                  available=lambda: os.path.exists(backend_path(EMOTION_MODEL_PATH, "int8"))
+                  or os.path.exists(EMOTION_MODEL_PATH))
+registry.register("embedding-int8",
+                  _int8_loader(lambda: EMBEDDING_MODEL_PATH, "Wav2Vec2Model", _load_embedding_model),
+                  available=lambda: os.path.exists(backend_path(EMBEDDING_MODEL_PATH, "int8"))
+                  or os.path.exists(EMBEDDING_MODEL_PATH))
+registry.register("asr-int8", _load_asr_int8)
+registry.register("emotion-onnx", _onnx_loader(lambda: EMOTION_MODEL_PATH, "logits"),
+                  available=lambda: os.path.exists(os.path.join(backend_path(EMOTION_MODEL_PATH, "onnx"), ONNX_MODEL)))
+registry.register("embedding-onnx", _onnx_loader(lambda: EMBEDDING_MODEL_PATH, "last_hidden_state"),
+                  available=lambda: os.path.exists(os.path.join(backend_path(EMBEDDING_MODEL_PATH, "onnx"), ONNX_MODEL)))
@@ -0,0 +1,109 @@
+"""Mergeable summaries for clip-level aggregates of block-wise analyses
+(``VoiceAnalyzer.long_form_s``), updated per block and merged in any order:
+
+* ``Moments`` – count, mean, variance (Chan et al.'s parallel update), min and
+  max: exact ``np.mean`` / ``np.std`` / range of everything added;
+* ``QuantileSketch`` – logarithmic buckets of relative width
+  ``relative_accuracy`` (as in DDSketch), for medians and other quantiles of
+  non-negative values with bounded relative error and memory that grows with
+  the spread of the values, not their number.
+
+Example:
+    pitch = Moments()
+    for block in blocks:
+        pitch.add(block_pitch_values(block))
+    pitch.mean, pitch.std
+"""
+
+import math
+from collections import defaultdict
+
+import numpy as np
+
+
+class Moments:
+    """Streaming count / mean / variance / min / max."""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, values):
+        values = np.asarray(values, dtype=np.float64).ravel()
+        if len(values) == 0:
+            return
+        other = Moments()
+        other.count = len(values)
+        other.mean = float(np.mean(values))
+        other.m2 = float(np.sum((values - other.mean) ** 2))
+        other.min = float(np.min(values))
+        other.max = float(np.max(values))
+        self.merge(other)
+
+    def merge(self, other):
+        if other.count == 0:
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.mean += delta * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @property
+    def std(self):
+        """Population standard deviation, as ``np.std``."""
+        return math.sqrt(self.m2 / self.count) if self.count else 0.0
+
+
+class QuantileSketch:
+    """Quantiles of non-negative values with relative error ``relative_accuracy``.
+
+    Args:
+        relative_accuracy (float): Maximum relative error of ``quantile``.
+        min_value (float): Values at or below this are counted as zero.
+    """
+
+    def __init__(self, relative_accuracy=0.01, min_value=1e-9):
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.min_value = min_value
+        self.bins = defaultdict(int)  # bucket k holds values in (gamma^(k-1), gamma^k]
+        self.zeros = 0
+        self.count = 0
+
+    def add(self, values):
+        values = np.asarray(values, dtype=np.float64).ravel()
+        positive = values[values > self.min_value]
+        self.zeros += len(values) - len(positive)
+        self.count += len(values)
+        keys, counts = np.unique(np.ceil(np.log(positive) / self._log_gamma).astype(np.int64), return_counts=True)
+        for key, n in zip(keys.tolist(), counts.tolist()):
+            self.bins[key] += n
+
+    def merge(self, other):
+        for key, n in other.bins.items():
+            self.bins[key] += n
+        self.zeros += other.zeros
+        self.count += other.count
+
+    def quantile(self, q):
+        """Approximate ``np.quantile(values, q)``; 0.0 when nothing was added."""
+        if self.count == 0:
+            return 0.0
+        rank = q * (self.count - 1)
+        seen = self.zeros
+        if rank < seen:
+            return 0.0
+        for key in sorted(self.bins):
+            seen += self.bins[key]
+            if rank < seen:
+                return 2 * self.gamma ** key / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.bins) / (self.gamma + 1)
+
+    def median(self):
+        return self.quantile(0.5)
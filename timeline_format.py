@@ -0,0 +1,142 @@
+"""Compact encodings of the per-window analysis timeline.
+
+The legacy ``timeline`` is one dict per window. The helpers here convert it to
+parallel float32 / int8 arrays plus an emotion label dictionary, in one of
+three encodings:
+
+* ``"columnar"`` – plain JSON lists, e.g. ``{"emotion": [0, 0, 1], "labels": ["sad", "happy"], ...}``
+* ``"base64"`` – each array as ``{"dtype": "<f4", "data": "<base64>"}``, still JSON
+* ``"msgpack"`` – arrays as raw bytes, for results serialised with msgpack (``pack``)
+
+With ``exact=True`` the float columns are float64 instead, so ``to_legacy``
+gives back exactly the values that were encoded; the analysis cache uses
+this, the API formats use float32. ``to_legacy`` turns any of them (or an
+already legacy list) back into the list of dicts that existing consumers
+expect.
+
+Example:
+    compact = encode_result(results, "base64")
+    payload = pack(encode_result(results, "msgpack"))
+    to_legacy(compact["timeline"]) == results["timeline"]   # up to float32 precision
+    to_legacy(encode_timeline(results["timeline"], "base64", exact=True)) == results["timeline"]
+"""
+
+import base64
+
+import numpy as np
+
+TIMELINE_FORMATS = ("legacy", "columnar", "base64", "msgpack")
+
+FLOAT_FIELDS = ("start", "confidence", "vocal_pressure")  # float32 (float64 if exact); "emotion" and "cluster" are int8
+MISSING = -1  # int8 stand-in for a ``None`` cluster
+SOURCES = ("computed", "interpolated")  # int8 codes of the optional adaptive-hop "source" field
+
+
+def to_arrays(timeline, float_dtype=np.float32):
+    """Columnar numpy view of a legacy timeline: ``(arrays, labels)``."""
+    labels = []
+    label_index = {}
+    emotions = np.empty(len(timeline), dtype=np.int8)
+    for i, entry in enumerate(timeline):
+        label = entry.get("emotion")
+        if label not in label_index:
+            label_index[label] = len(labels)
+            labels.append(label)
+        emotions[i] = label_index[label]
+    arrays = {"emotion": emotions}
+    for field in FLOAT_FIELDS:
+        arrays[field] = np.array([entry.get(field) or 0.0 for entry in timeline], dtype=float_dtype)
+    arrays["cluster"] = np.array(
+        [MISSING if entry.get("cluster") is None else entry["cluster"] for entry in timeline], dtype=np.int8)
+    if timeline and "source" in timeline[0]:
+        arrays["source"] = np.array([SOURCES.index(entry["source"]) for entry in timeline], dtype=np.int8)
+    return arrays, labels
+
+
+def _json_list(array):
+    if array.dtype == np.float32:
+        # Round away float32 noise so 0.05 is written as 0.05, not 0.05000000074505806
+        return np.round(array.astype(np.float64), 6).tolist()
+    return array.tolist()
+
+
+def encode_timeline(timeline, fmt="columnar", exact=False):
+    """Encode a legacy timeline as "columnar", "base64" or "msgpack" (raw bytes arrays).
+
+    ``exact`` stores the float columns as float64, which decode without loss.
+    """
+    if fmt == "legacy":
+        return to_legacy(timeline)
+    if fmt not in TIMELINE_FORMATS:
+        raise ValueError(f"Unknown timeline format: {fmt}")
+    arrays, labels = to_arrays(to_legacy(timeline), np.float64 if exact else np.float32)
+    encoded = {"format": fmt, "length": len(arrays["start"]), "labels": labels}
+    for field, array in arrays.items():
+        if fmt == "columnar":
+            encoded[field] = _json_list(array)
+        else:
+            data = array.astype(array.dtype.newbyteorder("<"), copy=False).tobytes()
+            encoded[field] = {"dtype": array.dtype.newbyteorder("<").str,
+                              "data": base64.b64encode(data).decode("ascii") if fmt == "base64" else data}
+    return encoded
+
+
+def _decode_array(value):
+    if isinstance(value, dict):
+        data = value["data"]
+        if isinstance(data, str):
+            data = base64.b64decode(data)
+        return np.frombuffer(data, dtype=np.dtype(value["dtype"]))
+    return np.asarray(value)
+
+
+def to_legacy(timeline):
+    """Legacy list-of-dicts timeline from any encoding produced by ``encode_timeline``."""
+    if timeline is None or isinstance(timeline, list):
+        return timeline
+    labels = timeline["labels"]
+    columns = {field: _decode_array(timeline[field]) for field in ("emotion", "cluster") + FLOAT_FIELDS}
+    floats = {field: _json_list(columns[field]) for field in FLOAT_FIELDS}
+    legacy = [
+        {
+            "start": floats["start"][i],
+            "emotion": labels[int(columns["emotion"][i])],
+            "confidence": floats["confidence"][i],
+            "vocal_pressure": floats["vocal_pressure"][i],
+            "cluster": None if columns["cluster"][i] == MISSING else int(columns["cluster"][i]),
+        }
+        for i in range(int(timeline["length"]))
+    ]
+    if "source" in timeline:
+        for entry, code in zip(legacy, _decode_array(timeline["source"])):
+            entry["source"] = SOURCES[int(code)]
+    return legacy
+
+
+def encode_result(result, fmt="columnar", exact=False):
+    """Copy of an analysis result with its timeline encoded as ``fmt`` (see ``encode_timeline``).
+
+    With "msgpack" the timeline arrays are raw ``bytes``; serialise the result
+    (or anything containing it) with ``pack``.
+    """
+    if not isinstance(result, dict) or "timeline" not in result:
+        return result
+    return dict(result, timeline=encode_timeline(result["timeline"], fmt, exact))
+
+
+def pack(obj):
+    """msgpack-serialise ``obj`` (e.g. a "msgpack"-encoded result)."""
+    import msgpack
+
+    return msgpack.packb(obj, use_bin_type=True)
+
+
+def decode_result(result):
+    """Analysis result with a legacy timeline, from ``encode_result`` output (dict or msgpack bytes)."""
+    if isinstance(result, (bytes, bytearray)):
+        import msgpack
+
+        result = msgpack.unpackb(result, raw=False)
+    if isinstance(result, dict) and "timeline" in result:
+        return dict(result, timeline=to_legacy(result["timeline"]))
+    return result
@@ -6,16 +6,30 @@ import torchaudio
 import librosa
 import webrtcvad
 import logging
-from sklearn.cluster import KMeans
 import firebase_admin
 from firebase_admin import credentials, db
 from firebase_admin.exceptions import FirebaseError
 from datetime import datetime
 import hashlib
+import math
 import tempfile
+import threading
+import time
+from collections import defaultdict
 import warnings
 from scipy import signal
 
+from audio_features import PITCH_BACKENDS, FeaturePlane
+from audio_io import (audio_duration, decode_bytes, is_in_memory, load_file, resolve_resampler, source_hash,
+                      source_size)
+from clustering import StreamingKMeans
+from analysis_cache import SQLiteAnalysisCache, make_cache_key
+from sketches import Moments, QuantileSketch
+from model_registry import (ASR_MODEL_NAME, EMBEDDING_MODEL_NAME, EMOTION_MODEL_NAME, MODEL_BACKENDS,
+                            model_key, registry)
+from timeline_format import decode_result, encode_result
+from voice_metrics import NULL_TIMINGS, StageTimings, current_timings, metrics, set_current_timings
+
 # Suppress specific warnings
 warnings.filterwarnings("ignore", category=UserWarning)
 warnings.filterwarnings("ignore", category=FutureWarning)
@@ -28,105 +42,143 @@ logger = logging.getLogger(__name__)
 os.environ['TRANSFORMERS_OFFLINE'] = '1'
 os.environ['HF_DATASETS_OFFLINE'] = '1'
 
-# Import required transformers components
-try:
-    from transformers import (
-        Wav2Vec2ForCTC,
-        Wav2Vec2Processor,
-        Wav2Vec2FeatureExtractor,
-        Wav2Vec2Model,
-        Wav2Vec2ForSequenceClassification,
-        pipeline
-    )
-    TRANSFORMERS_AVAILABLE = True
-except ImportError as e:
-    logger.error(f"Failed to import transformers: {str(e)}")
-    TRANSFORMERS_AVAILABLE = False
-
 try:
     import noisereduce as nr
 except ImportError:
     nr = None
 
-# Initialize Firebase (optional)
-try:
-    cred = credentials.Certificate("serviceAccountKey.json")
-    firebase_admin.initialize_app(cred, {
-        'databaseURL': 'https://mindfulapp-ad0fa-default-rtdb.firebaseio.com/'
-    })
-except FileNotFoundError:
-    print("Firebase credential not found – skipping Firebase initialization")
-except Exception as e:
-    print(f"Firebase initialization error: {e}")
+_vad_buffers = threading.local()  # per-thread int16 PCM buffer reused by vad_segments
+
+_firebase_lock = threading.Lock()
+_firebase_ready = None
+
+
+def init_firebase():
+    """Initialise Firebase once per process, on first use. Returns whether it is usable."""
+    global _firebase_ready
+    with _firebase_lock:
+        if _firebase_ready is not None:
+            return _firebase_ready
+        try:
+            if not firebase_admin._apps:
+                cred = credentials.Certificate("serviceAccountKey.json")
+                firebase_admin.initialize_app(cred, {
+                    'databaseURL': 'https://mindfulapp-ad0fa-default-rtdb.firebaseio.com/'
+                })
+            _firebase_ready = True
+        except FileNotFoundError:
+            print("Firebase credential not found – skipping Firebase initialization")
+            _firebase_ready = False
+        except Exception as e:
+            print(f"Firebase initialization error: {e}")
+            _firebase_ready = False
+        return _firebase_ready
+
+
+def _registry_model(attr, name, index=None):
+    """Property resolving to a model from the process-wide registry on first access.
+
+    Assigning to the attribute overrides the registry for that analyzer instance.
+    """
+    def getter(self):
+        if attr in self._overrides:
+            return self._overrides[attr]
+        loaded = self.models.get(model_key(name, self.model_backend), self.device)
+        if loaded is None or index is None:
+            return loaded
+        return loaded[index]
+
+    def setter(self, value):
+        self._overrides[attr] = value
+
+    return property(getter, setter)
+
 
 class VoiceAnalyzer:
-    def __init__(self, use_safetensors=False):
+    # Models are loaded lazily from the shared registry on first access
+    processor = _registry_model("processor", "emotion", 0)
+    model = _registry_model("model", "emotion", 1)
+    embedding_processor = _registry_model("embedding_processor", "embedding", 0)
+    embedding_model = _registry_model("embedding_model", "embedding", 1)
+    asr = _registry_model("asr", "asr")
+
+    def __init__(self, use_safetensors=False, batch_size=32, analysis_mode="window", cache=None,
+                 models=None, pitch_backend="autocorr", firebase_writer=None, model_backend="torch",
+                 hop_schedule="fixed"):
         """Initialize the VoiceAnalyzer with optional safetensors support.
         
+        Construction is cheap: models are only loaded when first used (or on
+        ``warm_up``) and are shared with every other analyzer in the process.
+
         Args:
             use_safetensors (bool): Whether to use safetensors format for model loading.
                                    Set to False if you encounter model loading issues.
+            batch_size (int): Number of analysis windows stacked into one forward
+                              pass of the emotion and embedding models.
+            analysis_mode (str): "window" runs the models on every window (exact);
+                                 "frame" encodes the clip once and pools frame-level
+                                 hidden states per window (much faster, approximate).
+            cache (AnalysisCache): Result cache backend. Defaults to a SQLite cache in
+                                   ``voice_cache.sqlite3`` shared by all processes.
+            models (ModelRegistry): Registry to load models from. Defaults to the
+                                    process-wide ``model_registry.registry``.
+            pitch_backend (str): Pitch tracker for ``analyze_pitch``: "autocorr" (default,
+                                 reuses the clip STFT), "yin" or "piptrack" (legacy).
+            firebase_writer (FirebaseWriter): When given, ``save_to_firebase`` queues results
+                                              on it for batched background writes.
+            model_backend (str): "torch" (fp32, default), "int8" (dynamically quantised
+                                 linear layers) or "onnx" (ONNX Runtime); the last two
+                                 run on CPU. Export them with ``export_models.py``.
+            hop_schedule (str): "fixed" runs the models on every 50 ms window; "adaptive"
+                                skips mostly silent windows, runs the models on a coarse
+                                hop and only refines to 50 ms where the emotion changes,
+                                interpolating the windows in between (window mode only).
         """
-        self.vad = webrtcvad.Vad(3)  # Aggressiveness mode (0-3)
-        self.device = 'cuda' if torch.cuda.is_available() else 'cpu'
+        self.vad_mode = 3  # Aggressiveness mode (0-3)
+        self.vad = webrtcvad.Vad(self.vad_mode)
+        if model_backend not in MODEL_BACKENDS:
+            raise ValueError(f"Unknown model_backend: {model_backend}")
+        if model_backend == "onnx" and analysis_mode == "frame":
+            raise ValueError("analysis_mode='frame' needs the torch or int8 model backend")
+        self.model_backend = model_backend
+        self.device = 'cuda' if torch.cuda.is_available() and model_backend == "torch" else 'cpu'
         logger.info(f"Using device: {self.device}")
         
         # Emotion classification model (small but effective)
-        self.model_name = "superb/wav2vec2-base-superb-er"
-        
-        # Initialize models as None first
-        self.model = None
-        self.embedding_model = None
-        self.processor = None
-        self.embedding_processor = None
-        
-        # Try to load models with local files first
-        local_model_path = os.path.join(os.path.dirname(__file__), "models", "wav2vec2-base-superb-er")
-        local_embedding_path = os.path.join(os.path.dirname(__file__), "models", "wav2vec2-large-960h")
-        
-        # Create models directory if it doesn't exist
-        os.makedirs(os.path.dirname(local_model_path), exist_ok=True)
-        
-        # Load emotion classification model
-        try:
-            if os.path.exists(local_model_path):
-                logger.info(f"Loading emotion model from local: {local_model_path}")
-                self.processor = Wav2Vec2FeatureExtractor.from_pretrained(local_model_path)
-                self.model = Wav2Vec2ForSequenceClassification.from_pretrained(
-                    local_model_path,
-                    local_files_only=True
-                ).to(self.device)
-                self.model.eval()
-            else:
-                logger.warning("Local emotion model not found. Some features will be disabled.")
-        except Exception as e:
-            logger.error(f"Failed to load local emotion model: {str(e)}")
-            
-        # Load embedding model
-        try:
-            if os.path.exists(local_embedding_path):
-                logger.info(f"Loading embedding model from local: {local_embedding_path}")
-                self.embedding_processor = Wav2Vec2FeatureExtractor.from_pretrained(local_embedding_path)
-                self.embedding_model = Wav2Vec2Model.from_pretrained(
-                    local_embedding_path,
-                    local_files_only=True
-                ).to(self.device)
-                self.embedding_model.eval()
-            else:
-                logger.warning("Local embedding model not found. Some features will be limited.")
-        except Exception as e:
-            logger.error(f"Failed to load local embedding model: {str(e)}")
+        self.model_name = EMOTION_MODEL_NAME
+        self.embedding_model_name = EMBEDDING_MODEL_NAME
+        self.asr_model_name = ASR_MODEL_NAME
+        self.models = models or registry
+        self._overrides = {}
         
         # Analysis parameters
         self.window_s = 1.0  # analysis window length (seconds)
         self.hop_s = 0.05    # hop length (seconds) – 50 ms
         self.use_vad = False  # disable VAD per user request
-
-        try:
-            self.asr = pipeline("automatic-speech-recognition", model="facebook/wav2vec2-base-960h", device=0 if self.device == 'cuda' else -1)
-        except Exception as e:
-            print("ASR pipeline init failed:", e)
-            self.asr = None
+        self.asr_batch_size = 8  # chunks per ASR forward pass in transcribe_chunks
+        self.asr_top_k = None    # only transcribe this many of the longest VAD chunks
+        self.batch_size = max(1, int(batch_size))
+        if analysis_mode not in ("window", "frame"):
+            raise ValueError(f"Unknown analysis_mode: {analysis_mode}")
+        self.analysis_mode = analysis_mode
+        if hop_schedule not in ("fixed", "adaptive"):
+            raise ValueError(f"Unknown hop_schedule: {hop_schedule}")
+        if hop_schedule == "adaptive" and analysis_mode == "frame":
+            raise ValueError("hop_schedule='adaptive' applies to analysis_mode='window'")
+        self.hop_schedule = hop_schedule
+        self.coarse_hop_s = 0.4          # adaptive: hop between model calls in stable regions
+        self.max_silence_ratio = 0.8     # adaptive: windows at least this silent are skipped
+        self.stability_threshold = 0.15  # adaptive: max probability change (total variation) to interpolate over
+        self.cluster_pca_dim = None      # PCA-reduce embeddings to this many dimensions before clustering
+        self.resampler = "auto"          # load_audio resampling: "auto", "soxr", "poly" or "librosa" (audio_io.resample)
+        self.long_form_s = None          # files longer than this (seconds) are analysed block by block
+        self.block_s = 60.0              # long-form block length (seconds)
+        self.block_context_s = 2.0       # long-form audio read on each side of a block (seconds)
+        self.frame_chunk_s = 30.0   # encoder chunk length in frame mode (seconds)
+        self.frame_overlap_s = 2.0  # context discarded on each side of a chunk
+        if pitch_backend not in PITCH_BACKENDS:
+            raise ValueError(f"Unknown pitch_backend: {pitch_backend}")
+        self.pitch_backend = pitch_backend
 
         self.emotion_labels = ['angry', 'disgust', 'fear', 'happy', 'neutral', 'sad', 'surprise']
 
@@ -142,44 +194,111 @@ class VoiceAnalyzer:
         torch.backends.cudnn.deterministic = True
         torch.use_deterministic_algorithms(True, warn_only=True)
 
-        self.cache_path = "voice_cache.json"
-        if os.path.exists(self.cache_path):
-            try:
-                with open(self.cache_path, "r", encoding="utf-8") as f:
-                    self.cache = json.load(f)
-            except Exception:
-                self.cache = {}
-        else:
-            self.cache = {}
+        if cache is None:
+            self.cache_path = "voice_cache.sqlite3"
+            cache = SQLiteAnalysisCache(self.cache_path)
+        self.cache = cache
+        self.firebase_writer = firebase_writer
+
+    def _cache_params(self):
+        """Analysis parameters that change the results and so belong in the cache key."""
+        return {
+            "sample_rate": 16000,
+            "window_s": self.window_s,
+            "hop_s": self.hop_s,
+            "analysis_mode": self.analysis_mode,
+            "emotion_model": self.model_name,
+            "embedding_model": self.embedding_model_name,
+            # The configured model, not whether it loads: lookups must not load it, and
+            # results record in metadata.transcribed whether ASR actually ran
+            "asr_model": None if "asr" in self._overrides and self._overrides["asr"] is None else self.asr_model_name,
+            "use_vad": self.use_vad,
+            "vad_mode": self.vad_mode,
+            "noise_reduction": nr is not None,
+            "pitch_backend": self.pitch_backend,
+            "model_backend": self.model_backend,
+            "hop_schedule": self.hop_schedule,
+            "cluster_pca_dim": self.cluster_pca_dim,
+            "resampler": resolve_resampler(self.resampler),
+            "timeline_encoding": "base64-f8",  # entries with float32 timelines were not lossless
+            **({"long_form_s": self.long_form_s, "block_s": self.block_s,
+                "block_context_s": self.block_context_s} if self.long_form_s is not None else {}),
+            **({"coarse_hop_s": self.coarse_hop_s, "max_silence_ratio": self.max_silence_ratio,
+                "stability_threshold": self.stability_threshold} if self.hop_schedule == "adaptive" else {}),
+        }
+
+    def _model_available(self, name, *attrs):
+        """Whether a model is usable, without loading it."""
+        if attrs and all(attr in self._overrides for attr in attrs):
+            return all(self._overrides[attr] is not None for attr in attrs)
+        return self.models.available(model_key(name, self.model_backend), self.device)
+
+    def models_available(self):
+        """Whether the emotion and embedding models are (or can be) loaded."""
+        return (self._model_available("emotion", "model", "processor")
+                and self._model_available("embedding", "embedding_model", "embedding_processor"))
+
+    def warm_up(self, names=("emotion", "embedding", "asr")):
+        """Load the given models now instead of on first use.
+
+        Returns:
+            dict: Seconds spent loading each model in this process.
+        """
+        return self.models.warm_up([model_key(name, self.model_backend) for name in names], self.device)
+
+    def cached_result(self, audio_path):
+        """Return the cached analysis of ``audio_path`` (a path or the file's bytes)
+        without decoding it or loading models.
+
+        Only the file-content level of the cache is consulted, so this is one file
+        hash and one lookup. Returns ``None`` on a miss.
+        """
+        if not self.models_available():
+            return None
+        return self._cache_lookup(make_cache_key("file:" + source_hash(audio_path), self._cache_params()))
+
+    def _cache_lookup(self, key):
+        """Cache lookup that follows ``{"ref": key}`` aliases written for file hashes."""
+        cached = self.cache.get(key)
+        if isinstance(cached, dict) and set(cached) == {"ref"}:
+            cached = self.cache.get(cached["ref"])
+        return decode_result(cached)
+
+    def load_audio(self, audio_path, offset=0.0, duration=None):
+        """Decode ``audio_path`` to mono float32 at 16 kHz (see audio_io.load_file).
+
+        ``audio_path`` may also be the encoded file's bytes (see audio_io.read_upload),
+        which are decoded in memory.
 
-    def load_audio(self, audio_path):
+        Args:
+            offset (float): Start of the range to decode, in seconds.
+            duration (float): Length of the range; ``None`` decodes to the end.
+        """
         try:
-            y, sr = librosa.load(audio_path, sr=16000)
-            return y, sr
+            if is_in_memory(audio_path):
+                return decode_bytes(audio_path, 16000, offset, duration, self.resampler)
+            return load_file(audio_path, 16000, offset, duration, self.resampler)
         except Exception as e:
             print(f"Error loading audio file: {e}")
             return None, None
             
-    def _analyze_basic_audio_features(self, y, sr):
+    def _analyze_basic_audio_features(self, y, sr, plane=None):
         """Basic audio feature analysis when ML models are not available."""
         try:
+            plane = plane or FeaturePlane(y, sr)
             # Calculate basic audio features
             duration = len(y) / sr
             rms = np.sqrt(np.mean(y**2))  # Root mean square (energy)
             
             # Simple pitch estimation
-            pitches, magnitudes = librosa.piptrack(y=y, sr=sr, fmin=75, fmax=400)
-            pitch_values = pitches[pitches > 0]
+            pitch_values = self._pitch_values(plane, piptrack_range=(75, 400))
             mean_pitch = float(np.mean(pitch_values)) if len(pitch_values) > 0 else 0
             
             # Zero-crossing rate (speech/music discrimination)
-            zcr = float(librosa.feature.zero_crossing_rate(y)[0, 0])
+            zcr = float(plane.zero_crossing_rate()[0])
             
             # Simple speech rate estimation (peaks in energy)
-            energy = np.array([
-                np.sum(y[i:i+1024]**2) 
-                for i in range(0, len(y), 512)
-            ])
+            energy = plane.energy(1024, 512)
             peaks, _ = signal.find_peaks(energy, distance=5)
             speech_rate = len(peaks) / (len(y) / sr) if len(y) > 0 else 0
             
@@ -218,15 +337,29 @@ class VoiceAnalyzer:
                 "analysis_method": "error"
             }
 
-    def detect_silence(self, audio, sr, frame_duration=30, threshold=0.01):
+    def detect_silence(self, audio, sr, frame_duration=30, threshold=0.01, plane=None):
+        plane = plane or FeaturePlane(audio, sr)
         frame_length = int(sr * frame_duration / 1000)
-        energy = librosa.feature.rms(y=audio, frame_length=frame_length, hop_length=frame_length)[0]
-        silent_frames = energy < threshold
+        energy = plane.rms(frame_length, frame_length)
+        silent_frames = plane.silence_mask(frame_length, threshold)
         return silent_frames, energy
 
-    def analyze_pitch(self, audio, sr):
-        pitches, magnitudes = librosa.piptrack(y=audio, sr=sr)
-        pitch_values = pitches[pitches > 0]
+    def _pitch_values(self, plane, piptrack_range=(150.0, 4000.0)):
+        """Voiced pitch values of a clip from the configured pitch backend.
+
+        The "piptrack" backend keeps the legacy behaviour of returning every
+        nonzero candidate of the dense pitch matrix within ``piptrack_range``; the
+        other backends give one f0 per voiced frame within MIN/MAX_PITCH_HZ.
+        """
+        if self.pitch_backend == "piptrack":
+            return plane.pitch_values(*piptrack_range)
+        f0 = plane.f0(self.pitch_backend, self.MIN_PITCH_HZ, self.MAX_PITCH_HZ,
+                      min_rms=self.MIN_ENERGY_THRESHOLD)
+        return f0[f0 > 0]
+
+    def analyze_pitch(self, audio, sr, plane=None):
+        plane = plane or FeaturePlane(audio, sr)
+        pitch_values = self._pitch_values(plane)
         if len(pitch_values) == 0:
             return {'mean_pitch': 0, 'pitch_std': 0, 'pitch_range': 0}
         return {
@@ -235,11 +368,9 @@ class VoiceAnalyzer:
             'pitch_range': np.max(pitch_values) - np.min(pitch_values)
         }
 
-    def analyze_energy(self, audio, sr, frame_length=2048, hop_length=512):
-        energy = np.array([
-            sum(abs(audio[i:i+frame_length] ** 2))
-            for i in range(0, len(audio), hop_length)
-        ])
+    def analyze_energy(self, audio, sr, frame_length=2048, hop_length=512, plane=None):
+        plane = plane or FeaturePlane(audio, sr)
+        energy = plane.energy(frame_length, hop_length)
         if np.max(energy) > 0:
             energy = energy / np.max(energy)
         return {
@@ -249,7 +380,8 @@ class VoiceAnalyzer:
             'min_energy': float(np.min(energy))
         }
 
-    def analyze_breathing(self, audio, sr):
+    def _breath_peaks(self, audio, sr):
+        """Sample positions of the peaks of the 100-1000 Hz band envelope, at least 0.5 s apart."""
         nyquist = 0.5 * sr
         low = 100 / nyquist
         high = 1000 / nyquist
@@ -257,6 +389,10 @@ class VoiceAnalyzer:
         filtered_audio = signal.filtfilt(b, a, audio)
         envelope = np.abs(signal.hilbert(filtered_audio))
         peaks, _ = signal.find_peaks(envelope, distance=sr//2)
+        return peaks
+
+    def analyze_breathing(self, audio, sr):
+        peaks = self._breath_peaks(audio, sr)
         if len(peaks) < 2:
             return {'breath_rate': 0, 'breath_regularity': 0}
         intervals = np.diff(peaks) / sr
@@ -266,127 +402,506 @@ class VoiceAnalyzer:
         }
 
     def detect_emotion(self, audio, sr):
+        return self.detect_emotion_batch([audio], sr)[0]
+
+    def detect_emotion_batch(self, windows, sr):
+        """Classify a batch of windows in a single forward pass.
+
+        Each window is peak-normalised on its own, exactly as ``detect_emotion``
+        does, so per-window results match the batch-1 path. Windows of unequal
+        length are zero-padded to the longest one.
+
+        Returns:
+            list: One ``{'emotion', 'confidence', 'probabilities'}`` dict per window.
+        """
         try:
             if sr != 16000:
-                audio = librosa.resample(audio, orig_sr=sr, target_sr=16000)
+                windows = [librosa.resample(w, orig_sr=sr, target_sr=16000) for w in windows]
                 sr = 16000
-            if np.max(np.abs(audio)) > 0:
-                audio = audio / np.max(np.abs(audio))
-            with torch.no_grad():
-                inputs = self.processor([audio], sampling_rate=sr, return_tensors="pt", padding="longest", truncation=False)
+            batch = []
+            for window in windows:
+                peak = np.max(np.abs(window))
+                batch.append(window / peak if peak > 0 else window)
+            with torch.no_grad(), current_timings().stage("emotion_forward"):
+                inputs = self.processor(batch, sampling_rate=sr, return_tensors="pt", padding="longest", truncation=False)
                 inputs = {k: v.to(self.device) for k, v in inputs.items()}
-                logits = self.model(**inputs).logits.squeeze(0)
+                logits = self.model(**inputs).logits
                 probs = torch.softmax(logits, dim=-1).cpu().numpy()
-            probabilities = {label: float(prob) for label, prob in zip(self.emotion_labels, probs)}
-            top_idx = int(np.argmax(probs))
-            return {
-                'emotion': self.emotion_labels[top_idx],
-                'confidence': float(probs[top_idx]),
-                'probabilities': probabilities
-            }
+            return [self._emotion_result(p) for p in probs]
         except Exception as e:
             print(f"Error in emotion detection: {e}")
-            return {'emotion': 'unknown', 'confidence': 0, 'probabilities': {}}
+            return [{'emotion': 'unknown', 'confidence': 0, 'probabilities': {}} for _ in windows]
 
-    def _chunk_audio(self, audio, sr, frame_ms=30):
+    def _emotion_result(self, probs):
+        probabilities = {label: float(prob) for label, prob in zip(self.emotion_labels, probs)}
+        top_idx = int(np.argmax(probs))
+        return {
+            'emotion': self.emotion_labels[top_idx],
+            'confidence': float(probs[top_idx]),
+            'probabilities': probabilities
+        }
+
+    def extract_embeddings(self, windows, sr):
+        """Mean-pooled last hidden state of the embedding model for a batch of windows.
+
+        Returns:
+            np.ndarray: Array of shape ``[len(windows), hidden_size]``.
+        """
+        with torch.no_grad(), current_timings().stage("embedding_forward"):
+            inputs = self.embedding_processor(list(windows), sampling_rate=sr, return_tensors="pt", padding=True).to(self.device)
+            hidden = self.embedding_model(**inputs).last_hidden_state  # [batch, time, feat]
+            return hidden.mean(dim=1).cpu().numpy()
+
+    def _window_starts(self, n_samples, sr):
+        """Start offsets (in samples) of every full analysis window in a clip."""
+        win_len = int(self.window_s * sr)
+        hop_len = int(self.hop_s * sr)
+        return list(range(0, n_samples - win_len + 1, hop_len))
+
+    def _iter_window_batches(self, y, sr, batch_size=None):
+        """Yield ``(starts, windows)`` pairs, ``windows`` being a ``[batch, win_len]`` array.
+
+        Windows are taken as strided views of ``y`` and only copied once per
+        batch when they are stacked for the models.
+        """
+        batch_size = batch_size or self.batch_size
+        win_len = int(self.window_s * sr)
+        hop_len = int(self.hop_s * sr)
+        if len(y) < win_len:
+            return
+        views = np.lib.stride_tricks.sliding_window_view(y, win_len)[::hop_len]
+        starts = self._window_starts(len(y), sr)
+        for i in range(0, len(starts), batch_size):
+            yield starts[i:i + batch_size], np.ascontiguousarray(views[i:i + batch_size])
+
+    def _analyze_windows_batched(self, y, sr):
+        """Exact per-window emotion results and embeddings, batched through the models."""
+        emo_results, embeddings = [], []
+        for _, windows in self._iter_window_batches(y, sr):
+            emo_results.extend(self.detect_emotion_batch(windows, sr))
+            embeddings.extend(self.extract_embeddings(windows, sr))
+        return emo_results, embeddings
+
+    def _encoder_stride(self, model):
+        return int(np.prod(model.config.conv_stride))
+
+    def _encode_segment(self, model, processor, segment, sr):
+        """Frame-level hidden states ``[frames, feat]`` of one audio segment.
+
+        ``model`` is either a ``Wav2Vec2Model`` or a sequence classifier, in which
+        case its encoder is used and the weighted layer sum applied when the
+        classifier was trained with one.
+        """
+        encoder = getattr(model, "wav2vec2", model)
+        weighted = getattr(model.config, "use_weighted_layer_sum", False) and hasattr(model, "layer_weights")
+        inputs = processor(segment, sampling_rate=sr, return_tensors="pt", padding=True)
+        inputs = {k: v.to(self.device) for k, v in inputs.items()}
+        outputs = encoder(**inputs, output_hidden_states=weighted)
+        if weighted:
+            hidden = torch.stack(outputs.hidden_states, dim=1)
+            norm_weights = torch.softmax(model.layer_weights, dim=-1)
+            hidden = (hidden * norm_weights.view(-1, 1, 1)).sum(dim=1)
+        else:
+            hidden = outputs.last_hidden_state
+        return hidden.squeeze(0)
+
+    def encode_frames(self, model, processor, y, sr):
+        """Encode a whole clip once and return its frame-level hidden states.
+
+        The clip is fed to the encoder in chunks of ``frame_chunk_s`` seconds that
+        overlap by ``frame_overlap_s`` on each side; only the central frames of each
+        chunk are kept, so every frame has at least that much context.
+
+        Returns:
+            torch.Tensor: Hidden states of shape ``[frames, feat]``.
+        """
+        stride = self._encoder_stride(model)
+        encoder = getattr(model, "wav2vec2", model)
+        total_frames = int(encoder._get_feat_extract_output_lengths(len(y)))
+        overlap = int(self.frame_overlap_s * sr) // stride * stride
+        step = max(stride, int(self.frame_chunk_s * sr) // stride * stride - 2 * overlap)
+        chunk_len = step + 2 * overlap
+
+        parts = []
+        with torch.no_grad(), current_timings().stage("encoder_forward"):
+            for core_start in range(0, len(y), step):
+                core_end = min(len(y), core_start + step)
+                seg_end = min(len(y), core_end + overlap)
+                seg_start = max(0, min(core_start - overlap, seg_end - chunk_len)) // stride * stride
+                hidden = self._encode_segment(model, processor, y[seg_start:seg_end], sr)
+                f_off = seg_start // stride
+                keep_from = core_start // stride - f_off
+                keep_to = min(core_end // stride if core_end < len(y) else total_frames, f_off + hidden.shape[0]) - f_off
+                parts.append(hidden[keep_from:keep_to])
+        return torch.cat(parts, dim=0)[:total_frames]
+
+    def _pool_windows(self, frames, starts, stride, win_frames):
+        """Mean-pool ``frames`` over every analysis window using prefix sums."""
+        frames64 = frames.double()
+        prefix = torch.cat([frames64.new_zeros(1, frames.shape[1]), torch.cumsum(frames64, dim=0)])
+        f0 = torch.as_tensor([s // stride for s in starts], dtype=torch.long)
+        f0 = torch.clamp(f0, max=frames.shape[0] - 1)
+        f1 = torch.clamp(f0 + win_frames, max=frames.shape[0])
+        counts = (f1 - f0).clamp(min=1).unsqueeze(1).double()
+        return ((prefix[f1] - prefix[f0]) / counts).to(frames.dtype)
+
+    def _analyze_windows_frame_level(self, y, sr):
+        """Approximate per-window emotion results and embeddings from one encoder pass.
+
+        The emotion classifier's projector and classifier heads are applied to the
+        window mean of the frame-level hidden states; since the projector is linear
+        this equals the classifier's own mean pooling over the window frames.
+        """
+        starts = self._window_starts(len(y), sr)
+        if not starts:
+            return [], []
+        win_len = int(self.window_s * sr)
+
+        emo_frames = self.encode_frames(self.model, self.processor, y, sr)
+        emo_stride = self._encoder_stride(self.model)
+        emo_win = int(self.model.wav2vec2._get_feat_extract_output_lengths(win_len))
+        with torch.no_grad():
+            pooled = self._pool_windows(emo_frames, starts, emo_stride, emo_win)
+            logits = self.model.classifier(self.model.projector(pooled))
+            probs = torch.softmax(logits, dim=-1).cpu().numpy()
+        emo_results = [self._emotion_result(p) for p in probs]
+
+        emb_frames = self.encode_frames(self.embedding_model, self.embedding_processor, y, sr)
+        emb_stride = self._encoder_stride(self.embedding_model)
+        emb_win = int(self.embedding_model._get_feat_extract_output_lengths(win_len))
+        embeddings = list(self._pool_windows(emb_frames, starts, emb_stride, emb_win).cpu().numpy())
+        return emo_results, embeddings
+
+    def transcribe_words(self, y, sr):
+        """Transcribe the whole clip once and return word ``(starts, ends)`` in seconds.
+
+        Uses the CTC word offsets of the ASR pipeline. Returns ``None`` when ASR is
+        unavailable or fails, in which case callers fall back to one word per window.
+        """
+        if self.asr is None or len(y) == 0:
+            return None
+        try:
+            kwargs = {"return_timestamps": "word"}
+            if len(y) / sr > 30:
+                kwargs["chunk_length_s"] = 30
+            with current_timings().stage("asr_forward"):
+                out = self.asr({"raw": y, "sampling_rate": sr}, **kwargs)
+            spans = [c["timestamp"] for c in out.get("chunks", []) if c.get("timestamp")]
+            word_starts = np.array([s for s, _ in spans], dtype=np.float64)
+            word_ends = np.array([e if e is not None else s for s, e in spans], dtype=np.float64)
+            return np.sort(word_starts), np.sort(word_ends)
+        except Exception as e:
+            logger.warning(f"Clip-level transcription failed: {e}")
+            return None
+
+    def _window_word_counts(self, starts, win_len, words, sr):
+        """Number of words overlapping each window ``[start, start + win_len)``.
+
+        With sorted word start and end times this is two binary searches per window:
+        words that start before the window ends, minus those that ended before it began.
+        """
+        if words is None or not starts:
+            return np.ones(len(starts), dtype=np.int64)
+        word_starts, word_ends = words
+        win_start = np.asarray(starts, dtype=np.float64) / sr
+        win_end = win_start + win_len / sr
+        return np.searchsorted(word_starts, win_end, side="left") - np.searchsorted(word_ends, win_start, side="right")
+
+    def vad_segments(self, audio, sr, frame_ms=30):
+        """Speech segments of ``audio`` found by WebRTC VAD, as ``(start, end)`` sample spans.
+
+        The signal is converted to int16 once, into a per-thread buffer reused across
+        calls, and every ``frame_ms`` frame is passed to the VAD as a memoryview slice
+        of it. Runs of consecutive speech frames become one span; a trailing partial
+        frame is ignored.
+
+        Args:
+            audio (np.ndarray): Float signal in [-1, 1].
+            sr (int): Sample rate (8, 16, 32 or 48 kHz).
+            frame_ms (int): VAD frame length (10, 20 or 30 ms).
+
+        Returns:
+            list: ``(start, end)`` tuples, ``audio[start:end]`` being one speech segment.
+        """
         frame_len = int(sr * frame_ms / 1000)
-        speech_frames = []
-        chunks = []
-        for i in range(0, len(audio), frame_len):
-            frame = audio[i:i+frame_len]
-            if len(frame) < frame_len:
-                break
-            is_speech = self.vad.is_speech((frame*32767).astype(np.int16).tobytes(), sr)
-            if is_speech:
-                speech_frames.append(frame)
-            else:
-                if speech_frames:
-                    chunks.append(np.concatenate(speech_frames))
-                    speech_frames = []
-        if speech_frames:
-            chunks.append(np.concatenate(speech_frames))
-        return chunks
-
-    def _select_significant_chunk(self, chunks, sr):
+        n_frames = len(audio) // frame_len
+        if n_frames == 0:
+            return []
+        n = n_frames * frame_len
+        pcm = getattr(_vad_buffers, "pcm", None)
+        if pcm is None or len(pcm) < n:
+            pcm = _vad_buffers.pcm = np.empty(n, dtype=np.int16)
+        np.multiply(audio[:n], 32767, out=pcm[:n], casting="unsafe")
+        frames = memoryview(pcm).cast("B")
+        frame_bytes = 2 * frame_len
+        speech = np.fromiter(
+            (self.vad.is_speech(frames[i * frame_bytes:(i + 1) * frame_bytes], sr) for i in range(n_frames)),
+            dtype=bool, count=n_frames)
+        edges = np.flatnonzero(np.diff(np.concatenate(([False], speech, [False])).astype(np.int8)))
+        return [(int(start) * frame_len, int(end) * frame_len) for start, end in zip(edges[::2], edges[1::2])]
+
+    def _chunk_audio(self, audio, sr, frame_ms=30):
+        """Speech chunks of ``audio`` as views into it (see ``vad_segments``)."""
+        return [audio[start:end] for start, end in self.vad_segments(audio, sr, frame_ms)]
+
+    def transcribe_chunks(self, chunks, sr, top_k=None, batch_size=None):
+        """Transcribe audio chunks with the ASR model in length-bucketed batches.
+
+        Chunks are sorted by length and grouped. When the ASR feature extractor
+        returns an attention mask (models with layer-norm feature extraction), a
+        batch is padded to its longest chunk and never holds a chunk less than half
+        as long. Models without one (group-norm feature extraction, such as
+        wav2vec2-base-960h) normalise over the whole padded input, so padding would
+        change their transcripts: their batches only hold chunks of equal length,
+        and other chunks are transcribed one at a time. With ``top_k`` only the
+        ``top_k`` longest chunks are transcribed.
+
+        Returns:
+            list: One dict per chunk, ``{"text", "words", "seconds"}`` where
+            ``seconds`` is the chunk's share of its batch's inference time, or
+            ``None`` for chunks that were skipped or whose batch failed.
+        """
+        results = [None] * len(chunks)
+        if self.asr is None or not chunks:
+            return results
+        batch_size = batch_size or self.asr_batch_size
+        order = sorted(range(len(chunks)), key=lambda i: len(chunks[i]), reverse=True)
+        order = [i for i in order[:top_k] if len(chunks[i]) > 0]
+
+        model = getattr(self.asr, "model", None)
+        feature_extractor = getattr(self.asr, "feature_extractor", None)
+        tokenizer = getattr(self.asr, "tokenizer", None)
+        target_sr = getattr(feature_extractor, "sampling_rate", sr)
+        can_pad = (bool(getattr(feature_extractor, "return_attention_mask", False))
+                   and getattr(getattr(model, "config", None), "feat_extract_norm", "layer") != "group")
+        batches, batch = [], []
+        for i in order:
+            longest = len(chunks[batch[0]]) if batch else 0
+            if batch and (len(batch) == batch_size
+                          or (len(chunks[i]) * 2 < longest if can_pad else len(chunks[i]) != longest)):
+                batches.append(batch)
+                batch = []
+            batch.append(i)
+        if batch:
+            batches.append(batch)
+
+        for batch in batches:
+            audio = [chunks[i] if sr == target_sr else librosa.resample(chunks[i], orig_sr=sr, target_sr=target_sr)
+                     for i in batch]
+            start = time.perf_counter()
+            try:
+                if model is None or feature_extractor is None or tokenizer is None:
+                    texts = [self.asr(a, sampling_rate=target_sr, chunk_length_s=None)["text"] for a in audio]
+                else:
+                    inputs = feature_extractor(audio, sampling_rate=target_sr, return_tensors="pt", padding="longest")
+                    inputs = {k: v.to(model.device) for k, v in inputs.items()
+                              if k in ("input_values", "attention_mask")}
+                    with torch.no_grad():
+                        ids = torch.argmax(model(**inputs).logits, dim=-1).cpu()
+                    # Drop the frames produced from padding before CTC decoding
+                    lengths = [int(model._get_feat_extract_output_lengths(len(a))) for a in audio]
+                    texts = [tokenizer.decode(row[:n]) for row, n in zip(ids, lengths)]
+            except Exception as e:
+                logger.warning(f"ASR failed for a batch of {len(batch)} chunks: {e}")
+                continue
+            elapsed = time.perf_counter() - start
+            current_timings().add_time("asr_forward", elapsed)
+            total = sum(len(a) for a in audio)
+            for i, a, text in zip(batch, audio, texts):
+                results[i] = {"text": text, "words": len(text.strip().split()), "seconds": elapsed * len(a) / total}
+        return results
+
+    def _select_significant_chunk(self, chunks, sr, top_k=None):
+        """The chunk with the most transcribed words (the longest one without ASR)."""
         if not chunks:
             return None
         if self.asr is None:
             return max(chunks, key=lambda x: len(x))
+        transcripts = self.transcribe_chunks(chunks, sr, top_k=top_k or self.asr_top_k)
         max_words = 0
         best_chunk = chunks[0]
-        for ch in chunks:
-            try:
-                text = self.asr(ch, sampling_rate=sr, chunk_length_s=None)["text"]
-                word_count = len(text.strip().split())
-                if word_count > max_words:
-                    max_words = word_count
-                    best_chunk = ch
-            except:
-                continue
+        for ch, transcript in zip(chunks, transcripts):
+            if transcript is not None and transcript["words"] > max_words:
+                max_words = transcript["words"]
+                best_chunk = ch
         return best_chunk
 
-    def analyze_audio(self, audio_path):
+    def analyze_audio(self, audio_path, progress_callback=None, timings=False):
+        """Run the full analysis pipeline on an audio file.
+
+        Args:
+            audio_path (str | bytes): Path to the audio file, or its encoded bytes.
+            progress_callback (callable): Optional ``callback(fraction, stage)`` called
+                                          as the analysis advances (fraction in [0, 1]).
+            timings (bool): Attach a ``timings`` block (per-stage seconds and
+                            counters, see voice_metrics) to the results.
+
+        Returns:
+            dict: The analysis results, or ``None`` if the analysis failed.
+        """
+        for event in self.analyze_audio_stream(audio_path, progress_callback, timings=timings):
+            if event["type"] == "result":
+                return event["result"]
+        return None
+
+    def analyze_audio_stream(self, audio_path, progress_callback=None, timings=False):
+        """Generator version of ``analyze_audio`` that yields results as they are computed.
+
+        Yields dict events:
+            ``{"type": "window", "index", "start", "emotion", "confidence", "vocal_pressure"}``
+                once per analysis window, as soon as its batch has been through the models;
+            ``{"type": "result", "result": {...}}``
+                last, with the clip-level aggregates, cluster labels and full timeline
+                (the same dict ``analyze_audio`` returns);
+            ``{"type": "error", "error": str}``
+                instead of the result if the analysis fails.
+
+        The clip is transcribed once before the first window so that every window
+        event already carries its vocal pressure; the clip-level pitch, energy,
+        breathing and silence features are computed after the last window.
+
+        Stage times and counters are recorded into ``voice_metrics.metrics``
+        unless it is disabled; with ``timings`` they are also attached to the
+        result as ``result["timings"]`` (never cached).
+        """
+        def report(fraction, stage):
+            if progress_callback is not None:
+                progress_callback(float(fraction), stage)
+
+        if timings or metrics.enabled:
+            stage_timings = StageTimings(metrics if metrics.enabled else None)
+        else:
+            stage_timings = NULL_TIMINGS
+        set_current_timings(stage_timings)
+
+        def finish(result):
+            stage_timings.publish()
+            if timings:
+                result = dict(result, timings=stage_timings.as_dict())
+            return result
+
         try:
-            y, sr = self.load_audio(audio_path)
-            if y is None:
-                return None
-                
-            # Basic audio features analysis
-            if self.model is None or self.embedding_model is None:
-                return self._analyze_basic_audio_features(y, sr)
-                
-            if nr is not None:
-                y = nr.reduce_noise(y=y, sr=sr)
-            # Normalise
-            if np.max(np.abs(y)) > 0:
-                y = y / np.max(np.abs(y))
+            models_ready = self.models_available()
+            cache_params = self._cache_params()
 
-            audio_hash = hashlib.sha1(y.tobytes()).hexdigest()
-            if audio_hash in self.cache:
-                return self.cache[audio_hash]
+            # Level 1: hash of the file bytes, checked before any decoding or DSP
+            file_key = None
+            if models_ready:
+                with stage_timings.stage("cache_lookup"):
+                    file_key = make_cache_key("file:" + source_hash(audio_path), cache_params)
+                    cached = self._cache_lookup(file_key)
+                if cached is not None:
+                    stage_timings.count("cache_hits")
+                    yield from self._replay_result(finish(cached))
+                    return
 
-            # Silence ratio (but keep silence in processing)
-            silent_frames, _ = self.detect_silence(y, sr)
-            silence_ratio = float(np.mean(silent_frames))
+            if models_ready and self.long_form_s is not None:
+                duration = audio_duration(audio_path)
+                if (duration is not None and duration > self.long_form_s
+                        and self.model is not None and self.embedding_model is not None):
+                    stage_timings.count("cache_misses")
+                    stage_timings.count("bytes_decoded", source_size(audio_path))
+                    yield from self._analyze_long_form(audio_path, duration, file_key, stage_timings, report, finish)
+                    return
 
-            # Overall analyses (pitch, energy, breathing) on full audio
-            pitch_analysis = self.analyze_pitch(y, sr)
-            energy_analysis = self.analyze_energy(y, sr)
-            breathing_analysis = self.analyze_breathing(y, sr)
+            report(0.0, "decoding")
+            with stage_timings.stage("decode"):
+                y, sr = self.load_audio(audio_path)
+            if y is None:
+                stage_timings.count("errors")
+                stage_timings.publish()
+                yield {"type": "error", "error": "Could not load audio file"}
+                return
+            stage_timings.count("bytes_decoded", source_size(audio_path))
+            stage_timings.count("samples_decoded", len(y))
 
-            # Windowed analysis every 50 ms
-            win_len = int(self.window_s * sr)
-            hop_len = int(self.hop_s * sr)
+            # Basic audio features analysis
+            if not models_ready or self.model is None or self.embedding_model is None:
+                with stage_timings.stage("features"):
+                    basic = self._analyze_basic_audio_features(y, sr)
+                yield {"type": "result", "result": finish(basic)}
+                return
+
+            # Level 2: hash of the decoded PCM, checked before noise reduction
+            with stage_timings.stage("cache_lookup"):
+                audio_hash = hashlib.sha1(np.ascontiguousarray(y).tobytes()).hexdigest()
+                cache_key = make_cache_key(audio_hash, cache_params)
+                cached = self._cache_lookup(cache_key)
+            if cached is not None:
+                stage_timings.count("cache_hits")
+                self.cache.set(file_key, {"ref": cache_key})
+                yield from self._replay_result(finish(cached))
+                return
+            stage_timings.count("cache_misses")
 
-            window_emotions, confidences, pressures, embeddings = [], [], [], []
+            report(0.05, "noise_reduction")
+            with stage_timings.stage("noise_reduction"):
+                if nr is not None:
+                    y = nr.reduce_noise(y=y, sr=sr)
+                # Normalise
+                if np.max(np.abs(y)) > 0:
+                    y = y / np.max(np.abs(y))
 
-            for start in range(0, len(y) - win_len + 1, hop_len):
-                window = y[start:start + win_len]
-                if len(window) < win_len * 0.5:
-                    continue  # skip too-short tail window
+            # Vocal pressure: window RMS over the words spoken in that window,
+            # from a single clip-level transcription with word offsets
+            report(0.1, "transcription")
+            starts = self._window_starts(len(y), sr)
+            win_len = int(self.window_s * sr)
+            with stage_timings.stage("transcription"):
+                words = self.transcribe_words(y, sr)
+            word_counts = self._window_word_counts(starts, win_len, words, sr)
+            plane = FeaturePlane(y, sr)
+            window_rms = np.sqrt(plane.energy(win_len, int(self.hop_s * sr))[:len(starts)] / win_len)
 
-                # Emotion classification
-                emo_res = self.detect_emotion(window, sr)
+            # Windowed analysis every 50 ms (or on the adaptive schedule)
+            report(0.2, "windows")
+            adaptive = self.hop_schedule == "adaptive"
+            window_index, window_emotions, confidences, pressures, sources = [], [], [], [], []
+            clusterer = StreamingKMeans(n_clusters=3, pca_dim=self.cluster_pca_dim)
+            embedded = []  # timeline positions of the computed windows fed to the clusterer
+            if adaptive:
+                window_outputs = self._iter_adaptive_windows(y, sr, starts, plane)
+            else:
+                window_outputs = self._iter_fixed_windows(y, sr)
+            windows_start = time.perf_counter()
+            for idx, emo_res, embedding, source in window_outputs:
+                pressure = float(window_rms[idx]) / max(int(word_counts[idx]), 1)
+                if embedding is not None:
+                    embedded.append(len(window_index))
+                    clusterer.add(embedding)
+                window_index.append(idx)
                 window_emotions.append(emo_res['emotion'])
                 confidences.append(emo_res['confidence'])
+                pressures.append(pressure)
+                sources.append(source)
+                event = {
+                    "type": "window",
+                    "index": idx,
+                    "start": float(idx * self.hop_s),
+                    "emotion": emo_res['emotion'],
+                    "confidence": emo_res['confidence'],
+                    "vocal_pressure": pressure
+                }
+                if adaptive:
+                    event["source"] = source
+                yield event
+                report(0.2 + 0.6 * (idx + 1) / max(len(starts), 1), "windows")
+
+            stage_timings.add_time("windows", time.perf_counter() - windows_start)
+            stage_timings.count("windows_processed", len(window_index))
+            stage_timings.count("windows_computed", clusterer.n_seen)
+
+            report(0.8, "features")
+            features_start = time.perf_counter()
+            # Silence ratio (but keep silence in processing)
+            silent_frames, _ = self.detect_silence(y, sr, plane=plane)
+            silence_ratio = float(np.mean(silent_frames))
 
-                # Vocal pressure
-                rms = np.sqrt(np.mean(window ** 2))
-                words = 1
-                if self.asr:
-                    try:
-                        text = self.asr(window, sampling_rate=sr)["text"]
-                        words = max(1, len(text.split()))
-                    except:
-                        pass
-                pressures.append(float(rms) / words)
-
-                # Embedding extraction (mean pooled last hidden state)
-                with torch.no_grad():
-                    inputs = self.embedding_processor(window, sampling_rate=sr, return_tensors="pt", padding=True).to(self.device)
-                    hidden = self.embedding_model(**inputs).last_hidden_state.squeeze(0)  # [time, feat]
-                    emb = hidden.mean(dim=0).cpu().numpy()
-                    embeddings.append(emb)
+            # Overall analyses (pitch, energy, breathing) on full audio, sharing
+            # the clip's feature plane
+            pitch_analysis = self.analyze_pitch(y, sr, plane=plane)
+            energy_analysis = self.analyze_energy(y, sr, plane=plane)
+            breathing_analysis = self.analyze_breathing(y, sr)
 
             # Aggregate emotion
             emotion_scores = defaultdict(float)
@@ -394,13 +909,14 @@ class VoiceAnalyzer:
                 emotion_scores[emo] += conf
             final_emotion = max(emotion_scores.items(), key=lambda x: x[1])[0] if emotion_scores else 'unknown'
             median_conf = float(np.median(confidences)) if confidences else 0.0
+            stage_timings.add_time("features", time.perf_counter() - features_start)
 
             # Embedding clustering
+            report(0.95, "clustering")
             cluster_labels = []
-            if embeddings:
-                k = min(3, len(embeddings))
-                kmeans = KMeans(n_clusters=k, random_state=0)
-                cluster_labels = kmeans.fit_predict(embeddings).tolist()
+            with stage_timings.stage("clustering"):
+                if clusterer.n_seen:
+                    cluster_labels = self._spread_labels(clusterer.labels(), embedded, len(window_index))
 
             duration = len(y) / sr
 
@@ -420,29 +936,396 @@ class VoiceAnalyzer:
                         "emotion": e,
                         "confidence": c,
                         "vocal_pressure": p,
-                        "cluster": cluster_labels[idx] if cluster_labels else None
+                        "cluster": cluster_labels[idx] if cluster_labels else None,
+                        **({"source": src} if adaptive else {})
                     }
-                    for idx, (i, e, c, p) in enumerate(zip(range(len(window_emotions)), window_emotions, confidences, pressures))
+                    for idx, (i, e, c, p, src) in enumerate(zip(window_index, window_emotions, confidences, pressures, sources))
                 ],
                 "metadata": {
                     "duration": duration,
                     "hash": audio_hash,
                     "window_s": self.window_s,
                     "hop_s": self.hop_s,
-                    "embedding_model": self.embedding_model_name
+                    "analysis_mode": self.analysis_mode,
+                    "model_backend": self.model_backend,
+                    "embedding_model": self.embedding_model_name,
+                    "hop_schedule": self.hop_schedule,
+                    "windows_total": len(starts),
+                    "windows_computed": clusterer.n_seen,
+                    "transcribed": words is not None
                 }
             }
 
-            # Cache and persist
-            self.cache[audio_hash] = results
-            with open(self.cache_path, "w", encoding="utf-8") as f:
-                json.dump(self.cache, f)
-            return results
+            # Cache and persist, with the timeline stored as base64 columns
+            with stage_timings.stage("cache_write"):
+                self.cache.set(cache_key, encode_result(results, "base64", exact=True))
+                self.cache.set(file_key, {"ref": cache_key})
+            report(1.0, "done")
+            yield {"type": "result", "result": finish(results)}
         except Exception as e:
             print(f"Error in analyze_audio: {e}")
-            return None
+            stage_timings.count("errors")
+            stage_timings.publish()
+            yield {"type": "error", "error": str(e)}
+        finally:
+            set_current_timings(NULL_TIMINGS)
+
+    def _analyze_long_form(self, audio_path, duration, file_key, stage_timings, report, finish):
+        """Block-wise ``analyze_audio_stream`` for long recordings.
+
+        The file is read in blocks of ``block_s`` seconds with ``block_context_s``
+        of context on each side (``load_audio`` with offset/duration), in two passes:
+
+        1. each block is decoded and noise-reduced, and its core is written to a
+           temporary float32 file while the clip peak is tracked;
+        2. each block is read back from that file, normalised by
+           the clip peak and analysed: the windows starting in its core go through
+           ASR, the models and the clusterer, and pitch, energy, silence and
+           breathing are computed over the core with the context as padding.
+
+        Clip-level aggregates are merged from the blocks (``sketches.Moments`` for
+        means and standard deviations, ``QuantileSketch`` for medians), so they
+        can differ slightly from the one-piece analysis near block edges. The
+        context is rounded up to the window and STFT grid, so at least
+        ``block_context_s`` is used.
+
+        Audio is held one block at a time (the noise-reduced clip lives in the
+        temporary file), so decoding, noise reduction and feature memory does not
+        grow with the recording. What does grow is the timeline, kept as compact
+        arrays until the result is built, and the cluster labels. Results are
+        cached under the file key only.
+        """
+        sr = 16000
+        hop_len = int(self.hop_s * sr)
+        win_len = int(self.window_s * sr)
+        silence_frame = int(sr * 30 / 1000)  # detect_silence frames
+        # Block edges fall on window, silence frame and STFT frame boundaries; read
+        # offsets only need the window and STFT grid, and the context is rounded up
+        align = math.lcm(hop_len, silence_frame, 512)
+        block_len = max(align, int(self.block_s * sr) // align * align)
+        read_align = math.lcm(hop_len, 512)
+        context = math.ceil(self.block_context_s * sr / read_align) * read_align
+        n_total = int(round(duration * sr))
+        n_blocks = max(1, math.ceil(n_total / block_len))
+        adaptive = self.hop_schedule == "adaptive"
+        starts_all = self._window_starts(n_total, sr)
+
+        def block_bounds(b, extra=0):
+            core_start = b * block_len
+            core_end = min(n_total, core_start + block_len)
+            return core_start, core_end, max(0, core_start - context), min(n_total, core_end + extra + context)
+
+        # Noise-reduced float32 samples, written and read back one block at a time
+        spill = tempfile.TemporaryFile(suffix=".f32")
+        try:
+            # Pass 1: decode and noise-reduce block by block into the spill file
+            digest = hashlib.sha1()
+            peak = 0.0
+            for b in range(n_blocks):
+                core_start, core_end, read_start, read_end = block_bounds(b)
+                with stage_timings.stage("decode"):
+                    y, _ = self.load_audio(audio_path, offset=read_start / sr, duration=(read_end - read_start) / sr)
+                if y is None:
+                    stage_timings.count("errors")
+                    stage_timings.publish()
+                    yield {"type": "error", "error": "Could not load audio file"}
+                    return
+                core = slice(core_start - read_start, core_end - read_start)
+                digest.update(np.ascontiguousarray(y[core], dtype=np.float32).tobytes())
+                stage_timings.count("samples_decoded", len(y[core]))
+                with stage_timings.stage("noise_reduction"):
+                    if nr is not None:
+                        y = nr.reduce_noise(y=y, sr=sr)
+                y = y[core]
+                spill.seek(core_start * 4)
+                spill.write(np.ascontiguousarray(y, dtype=np.float32).tobytes())
+                if len(y):
+                    peak = max(peak, float(np.max(np.abs(y))))
+                report(0.2 * (b + 1) / n_blocks, "noise_reduction")
+            spill.flush()
+            scale = np.float32(1 / peak) if peak > 0 else np.float32(1)
+
+            # Pass 2: windows, transcription and clip features per block
+            clusterer = StreamingKMeans(n_clusters=3, pca_dim=self.cluster_pca_dim)
+            labels, label_index = [], {}
+            columns = {"index": [], "emotion": [], "confidence": [], "vocal_pressure": [], "source": []}
+            embedded = []  # timeline positions of the computed windows fed to the clusterer
+            emotion_scores = defaultdict(float)
+            confidence_sketch, pressure_sketch = QuantileSketch(), QuantileSketch()
+            pitch, energy, breath_intervals = Moments(), Moments(), Moments()
+            silent_frames, total_frames, last_breath = 0, 0, None
+            transcribed = False
+            n_entries = 0
+            for b in range(n_blocks):
+                core_start, core_end, read_start, read_end = block_bounds(b, extra=win_len)
+                spill.seek(read_start * 4)
+                stored = np.fromfile(spill, dtype=np.float32, count=read_end - read_start)
+                y = np.zeros(read_end - read_start, dtype=np.float32)  # samples never decoded stay silent
+                y[:len(stored)] = stored
+                y *= scale
+                off = core_start - read_start
+                first = -(-core_start // hop_len)
+                last = min(len(starts_all), -(-core_end // hop_len))
+                block = {key: [] for key in columns}
+
+                if last > first:
+                    local_starts = [k * hop_len - read_start for k in range(first, last)]
+                    with stage_timings.stage("transcription"):
+                        words = self.transcribe_words(y, sr)
+                    transcribed = transcribed or words is not None
+                    word_counts = self._window_word_counts(local_starts, win_len, words, sr)
+                    plane = FeaturePlane(y, sr)
+                    window_rms = np.sqrt(plane.energy(win_len, hop_len)[np.array(local_starts) // hop_len] / win_len)
+                    segment = y[local_starts[0]:local_starts[-1] + win_len]
+                    if adaptive:
+                        window_outputs = self._iter_adaptive_windows(
+                            segment, sr, self._window_starts(len(segment), sr), FeaturePlane(segment, sr))
+                    else:
+                        window_outputs = self._iter_fixed_windows(segment, sr)
+                    windows_start = time.perf_counter()
+                    for local_idx, emo_res, embedding, source in window_outputs:
+                        idx = first + local_idx
+                        pressure = float(window_rms[local_idx]) / max(int(word_counts[local_idx]), 1)
+                        if embedding is not None:
+                            embedded.append(n_entries)
+                            clusterer.add(embedding)
+                        n_entries += 1
+                        label = emo_res['emotion']
+                        if label not in label_index:
+                            label_index[label] = len(labels)
+                            labels.append(label)
+                        emotion_scores[label] += emo_res['confidence']
+                        for key, value in (("index", idx), ("emotion", label_index[label]),
+                                           ("confidence", emo_res['confidence']), ("vocal_pressure", pressure),
+                                           ("source", source)):
+                            block[key].append(value)
+                        event = {
+                            "type": "window",
+                            "index": idx,
+                            "start": float(idx * self.hop_s),
+                            "emotion": label,
+                            "confidence": emo_res['confidence'],
+                            "vocal_pressure": pressure
+                        }
+                        if adaptive:
+                            event["source"] = source
+                        yield event
+                    stage_timings.add_time("windows", time.perf_counter() - windows_start)
+                else:
+                    plane = FeaturePlane(y, sr)
+
+                with stage_timings.stage("features"):
+                    core_y = y[off:off + core_end - core_start]
+                    silent, _ = self.detect_silence(core_y, sr)
+                    silent_frames += int(np.sum(silent))
+                    total_frames += len(silent)
+                    # STFT frames of the block plane centred in the core
+                    lo = off // plane.hop_length
+                    hi = lo + -(-(core_end - core_start) // plane.hop_length)
+                    if self.pitch_backend == "piptrack":
+                        pitch.add(self._pitch_values(FeaturePlane(core_y, sr)))
+                    else:
+                        f0 = plane.f0(self.pitch_backend, self.MIN_PITCH_HZ, self.MAX_PITCH_HZ,
+                                      min_rms=self.MIN_ENERGY_THRESHOLD)[lo:hi]
+                        pitch.add(f0[f0 > 0])
+                    energy.add(plane.energy(2048, 512)[lo:hi])
+                    for p in self._breath_peaks(y, sr):
+                        position = read_start + int(p)
+                        if not core_start <= position < core_end:
+                            continue
+                        if last_breath is not None:
+                            if position - last_breath < sr // 2:
+                                continue
+                            breath_intervals.add([(position - last_breath) / sr])
+                        last_breath = position
+
+                columns["index"].append(np.array(block["index"], dtype=np.int64))
+                columns["emotion"].append(np.array(block["emotion"], dtype=np.int8))
+                for key in ("confidence", "vocal_pressure"):
+                    columns[key].append(np.array(block[key], dtype=np.float32))
+                    (confidence_sketch if key == "confidence" else pressure_sketch).add(block[key])
+                columns["source"].append(np.array([source == "computed" for source in block["source"]]))
+                report(0.2 + 0.75 * (b + 1) / n_blocks, "windows")
+        finally:
+            spill.close()
+
+        report(0.95, "clustering")
+        cluster_labels = []
+        with stage_timings.stage("clustering"):
+            if clusterer.n_seen:
+                cluster_labels = self._spread_labels(clusterer.labels(), embedded, n_entries)
+        stage_timings.count("windows_processed", n_entries)
+        stage_timings.count("windows_computed", clusterer.n_seen)
+
+        columns = {key: np.concatenate(blocks) if blocks else np.zeros(0) for key, blocks in columns.items()}
+        final_emotion = max(emotion_scores.items(), key=lambda x: x[1])[0] if emotion_scores else 'unknown'
+        results = {
+            "emotion": {"label": final_emotion, "confidence": confidence_sketch.median()},
+            "features": {
+                'pitch_mean': float(pitch.mean),
+                "pitch_std": float(pitch.std),
+                "energy_mean": float(energy.mean / energy.max) if energy.max > 0 else float(energy.mean),
+                "speech_silence_ratio": float(silent_frames / total_frames) if total_frames else 0.0,
+                "breath_rate": float(60 / breath_intervals.mean) if breath_intervals.count else 0.0,
+                "vocal_pressure_median": pressure_sketch.median()
+            },
+            "timeline": [
+                {
+                    "start": float(i * self.hop_s),
+                    "emotion": labels[e],
+                    "confidence": float(c),
+                    "vocal_pressure": float(p),
+                    "cluster": cluster_labels[pos] if cluster_labels else None,
+                    **({"source": "computed" if computed else "interpolated"} if adaptive else {})
+                }
+                for pos, (i, e, c, p, computed) in enumerate(zip(
+                    columns["index"].tolist(), columns["emotion"].tolist(), columns["confidence"].tolist(),
+                    columns["vocal_pressure"].tolist(), columns["source"].tolist()))
+            ],
+            "metadata": {
+                "duration": n_total / sr,
+                "hash": digest.hexdigest(),
+                "window_s": self.window_s,
+                "hop_s": self.hop_s,
+                "analysis_mode": self.analysis_mode,
+                "model_backend": self.model_backend,
+                "embedding_model": self.embedding_model_name,
+                "hop_schedule": self.hop_schedule,
+                "windows_total": len(starts_all),
+                "windows_computed": clusterer.n_seen,
+                "transcribed": transcribed,
+                "long_form": {"block_s": block_len / sr, "blocks": n_blocks}
+            }
+        }
+
+        with stage_timings.stage("cache_write"):
+            self.cache.set(file_key, encode_result(results, "base64", exact=True))
+        report(1.0, "done")
+        yield {"type": "result", "result": finish(results)}
+
+    def _iter_window_outputs(self, y, sr):
+        """Yield ``(starts, emotion_results, embeddings)`` per batch of windows."""
+        if self.analysis_mode == "frame":
+            emo_results, embeddings = self._analyze_windows_frame_level(y, sr)
+            starts = self._window_starts(len(y), sr)
+            for i in range(0, len(starts), self.batch_size):
+                j = i + self.batch_size
+                yield starts[i:j], emo_results[i:j], embeddings[i:j]
+            return
+        for batch_starts, windows in self._iter_window_batches(y, sr):
+            yield batch_starts, self.detect_emotion_batch(windows, sr), self.extract_embeddings(windows, sr)
+
+    def _iter_fixed_windows(self, y, sr):
+        """Yield ``(index, emotion_result, embedding, "computed")`` for every window, in order."""
+        idx = 0
+        for _, emo_batch, emb_batch in self._iter_window_outputs(y, sr):
+            for emo_res, embedding in zip(emo_batch, emb_batch):
+                yield idx, emo_res, embedding, "computed"
+                idx += 1
+
+    def _window_silence(self, starts, win_len, plane, sr, frame_duration=30):
+        """Fraction of the 30 ms ``detect_silence`` frames in each window that are silent."""
+        frame_length = int(sr * frame_duration / 1000)
+        mask = plane.silence_mask(frame_length, self.MIN_ENERGY_THRESHOLD)
+        counts = np.concatenate(([0], np.cumsum(mask)))
+        first = np.asarray(starts, dtype=np.int64) // frame_length
+        last = np.minimum((np.asarray(starts, dtype=np.int64) + win_len) // frame_length, len(mask))
+        return (counts[last] - counts[first]) / np.maximum(last - first, 1)
+
+    def _emotion_vector(self, emo_res):
+        return np.array([emo_res['probabilities'].get(label, 0.0) for label in self.emotion_labels])
+
+    def _iter_adaptive_windows(self, y, sr, starts, plane):
+        """Adaptive-hop version of ``_iter_fixed_windows``.
+
+        Windows that are at least ``max_silence_ratio`` silent are dropped. Each
+        remaining run of windows is first analysed every ``coarse_hop_s`` (run ends
+        included); then, round by round, the midpoint between two neighbouring
+        computed windows is analysed whenever their dominant emotion differs or
+        their probabilities differ by more than ``stability_threshold``, down to the
+        50 ms hop. Windows left in between are linearly interpolated and yielded
+        with source "interpolated" and no embedding. Yields in time order once the
+        schedule is complete.
+        """
+        if not starts:
+            return
+        win_len = int(self.window_s * sr)
+        hop_len = int(self.hop_s * sr)
+        step = max(1, int(round(self.coarse_hop_s / self.hop_s)))
+        kept = np.flatnonzero(self._window_silence(starts, win_len, plane, sr) < self.max_silence_ratio)
+        if len(kept) == 0:
+            return
+        runs = np.split(kept, np.flatnonzero(np.diff(kept) > 1) + 1)
+        run_id = np.full(len(starts), -1)
+        todo = set()
+        for r, run in enumerate(runs):
+            run_id[run] = r
+            todo.update(range(int(run[0]), int(run[-1]) + 1, step))
+            todo.add(int(run[-1]))
+
+        views = np.lib.stride_tricks.sliding_window_view(y, win_len)[::hop_len]
+        computed = {}
+        while todo:
+            order = sorted(todo)
+            for i in range(0, len(order), self.batch_size):
+                batch = order[i:i + self.batch_size]
+                windows = np.ascontiguousarray(views[batch])
+                emo_batch = self.detect_emotion_batch(windows, sr)
+                emb_batch = self.extract_embeddings(windows, sr)
+                for j, emo_res, embedding in zip(batch, emo_batch, emb_batch):
+                    computed[j] = (emo_res, self._emotion_vector(emo_res), embedding)
+            points = sorted(computed)
+            todo = set()
+            for a, b in zip(points, points[1:]):
+                if b - a > 1 and run_id[a] == run_id[b] and (
+                        computed[a][0]['emotion'] != computed[b][0]['emotion']
+                        or 0.5 * np.abs(computed[a][1] - computed[b][1]).sum() > self.stability_threshold):
+                    todo.add((a + b) // 2)
+
+        points = np.array(sorted(computed))
+        for j in kept:
+            j = int(j)
+            if j in computed:
+                emo_res, _, embedding = computed[j]
+                yield j, emo_res, embedding, "computed"
+                continue
+            pos = np.searchsorted(points, j)
+            a, b = int(points[pos - 1]), int(points[pos])
+            w = (j - a) / (b - a)
+            probs = (1 - w) * computed[a][1] + w * computed[b][1]
+            yield j, self._emotion_result(probs), None, "interpolated"
+
+    @staticmethod
+    def _spread_labels(labels, positions, n):
+        """Labels for ``n`` timeline points from those at ``positions``, by nearest neighbour."""
+        labels = np.asarray(labels)
+        if len(positions) == n:
+            return labels.tolist()
+        positions = np.asarray(positions)
+        points = np.arange(n)
+        right = np.minimum(np.searchsorted(positions, points), len(positions) - 1)
+        left = np.maximum(right - 1, 0)
+        nearest = np.where(points - positions[left] <= positions[right] - points, left, right)
+        return labels[nearest].tolist()
+
+    def _replay_result(self, result):
+        """Stream events for a cached result: its timeline windows, then the result.
+
+        Window indices are recovered from the start times, as the adaptive hop
+        schedule leaves gaps in the timeline.
+        """
+        hop_s = result.get("metadata", {}).get("hop_s", self.hop_s)
+        for entry in result.get("timeline", []):
+            yield {"type": "window", "index": int(round(entry["start"] / hop_s)),
+                   **{k: v for k, v in entry.items() if k != "cluster"}}
+        yield {"type": "result", "result": result}
 
     def save_to_firebase(self, user_id, analysis_results):
+        if self.firebase_writer is not None:
+            # Key is assigned locally; the write happens in the writer's next batch
+            return self.firebase_writer.submit(user_id, analysis_results)
+        if not init_firebase():
+            return None
         try:
             ref = db.reference(f'users/{user_id}/voice_analyses')
             new_analysis_ref = ref.push()
@@ -9,95 +9,391 @@ Endpoints:
         form-data:  audio  (file, required)
                     user_id (string, optional) – if provided and Firebase is configured, results are saved.
 
-Returns JSON with the analysis results produced by VoiceAnalyzer.analyze_audio.
+        Returns JSON with the analysis results produced by VoiceAnalyzer.analyze_audio.
+        ?timeline=columnar|base64 returns the timeline as parallel arrays instead of
+        one dict per window; ?timeline=msgpack returns the whole result as
+        application/msgpack (400 if msgpack is not installed). See timeline_format.py.
+
+    POST /analyze/stream
+        Same form-data as /analyze. Streams the analysis as Server-Sent Events: one
+        "window" event per analysis window as soon as it is computed, then a
+        "result" event with the full analysis (or an "error" event). Pass
+        ?format=ndjson for newline-delimited JSON instead. ?timeline=columnar|base64
+        applies to the result event.
+
+    POST /jobs
+        Same form-data as /analyze. Queues the upload for a background worker and
+        returns 202 with {"id": ...}. Returns 429 when the queue is full.
+
+    GET /jobs/<id>
+        Status ("queued", "running", "done", "failed"), progress, timings and, once
+        done, the analysis result. Accepts the same ?timeline= parameter as /analyze.
+        timings.stages holds the per-stage timings of the finished analysis.
+
+    GET /metrics
+        Per-stage latency histograms and counters (windows processed, cache
+        hits/misses, bytes decoded, requests) in the Prometheus text format.
+        See voice_metrics.py.
+
+Pass ?timings=1 to /analyze or /analyze/stream to add a "timings" block (seconds
+per stage, including the upload and the Firebase hand-off, plus counters) to
+the result.
+
+Environment:
+    VOICE_API_WORKERS    number of analysis worker processes for /jobs (default 2)
+    VOICE_API_MAX_QUEUE  maximum number of jobs waiting for a worker (default 16)
+    VOICE_API_FIREBASE_TIMELINE  how the timeline is stored in Firebase: "full"
+                         (default), "downsample", "separate" or "none"
+    VOICE_METRICS        set to 0 to stop recording metrics (/metrics stays empty)
+    VOICE_API_MAX_UPLOAD_MB  largest accepted request body (default 200); larger
+                         requests get 413
+    VOICE_API_SPILL_MB   uploads up to this size are decoded from memory (default 32)
+
+Firebase saves are queued on a background ``FirebaseWriter`` and written in
+batches, so they never block a response. Queued writes and the /jobs workers
+are flushed and stopped when the process exits.
+
+/analyze and /analyze/stream decode uploads from memory (see audio_io.py);
+only uploads above VOICE_API_SPILL_MB go through a temporary file. /jobs still
+writes each upload to disk for the worker processes.
 """
 
+import atexit
+import importlib.util
 import os
+import json
 import tempfile
 import logging
-from flask import Flask, request, jsonify
+import threading
+import time
+from flask import Flask, Request, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
 
+from audio_io import UploadTooLarge, is_in_memory, read_upload
+
+from timeline_format import TIMELINE_FORMATS, encode_result, pack
+from voice_metrics import metrics
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+MAX_UPLOAD_BYTES = int(float(os.environ.get("VOICE_API_MAX_UPLOAD_MB", 200)) * 2 ** 20)
+SPILL_BYTES = int(float(os.environ.get("VOICE_API_SPILL_MB", 32)) * 2 ** 20)
+
+
+class UploadRequest(Request):
+    """Keeps multipart uploads up to SPILL_BYTES in memory (werkzeug spills past 500 KB).
+
+    Larger requests are parsed straight into a named temporary file, which
+    ``read_upload`` then decodes in place instead of copying it again. Files not
+    handed to the analysis are closed and removed when the request ends.
+    """
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if total_content_length is None or total_content_length <= SPILL_BYTES:
+            # Chunked bodies have no length up front: spool, and copy if it gets large
+            return tempfile.SpooledTemporaryFile(max_size=SPILL_BYTES, mode="rb+")
+        spill = tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(filename or "")[1])
+        self.spill_files = getattr(self, "spill_files", []) + [spill]
+        return spill
+
+
 app = Flask(__name__)
+app.request_class = UploadRequest
+app.config["MAX_CONTENT_LENGTH"] = MAX_UPLOAD_BYTES
 CORS(app)
 
+
+@app.teardown_request
+def _remove_spill_files(error=None):
+    for spill in getattr(request, "spill_files", []):
+        spill.close()
+        try:
+            os.remove(spill.name)
+        except OSError as e:
+            logger.error(f"Error removing temp file: {str(e)}")
+
 # Initialize analyzer when the app starts
 analyzer = None
 try:
+    from firebase_writer import FirebaseWriter
     from voice_analysis import VoiceAnalyzer
-    analyzer = VoiceAnalyzer()
+    analyzer = VoiceAnalyzer(firebase_writer=FirebaseWriter(
+        timeline=os.environ.get("VOICE_API_FIREBASE_TIMELINE", "full")))
     logger.info("VoiceAnalyzer initialized successfully")
 except Exception as e:
     logger.error(f"Failed to initialize VoiceAnalyzer: {str(e)}")
     analyzer = None
 
-@app.route("/analyze", methods=["POST"])
-def analyze():
-    if not analyzer:
-        return jsonify({"error": "Backend analyzer not initialized"}), 500
-        
+job_queue = None
+_job_queue_lock = threading.Lock()
+
+
+def get_job_queue():
+    """Start the analysis worker pool on first use."""
+    global job_queue
+    with _job_queue_lock:
+        if job_queue is None:
+            from voice_jobs import JobQueue
+            job_queue = JobQueue(
+                num_workers=int(os.environ.get("VOICE_API_WORKERS", 2)),
+                max_queue=int(os.environ.get("VOICE_API_MAX_QUEUE", 16)),
+                firebase_timeline=os.environ.get("VOICE_API_FIREBASE_TIMELINE", "full"),
+            )
+            logger.info(f"Started {job_queue.num_workers} analysis workers")
+        return job_queue
+
+
+@atexit.register
+def _shutdown():
+    """Let the job workers and the Firebase writer write what they have buffered."""
+    if job_queue is not None:
+        job_queue.shutdown(timeout=30)
+    if analyzer is not None and analyzer.firebase_writer is not None:
+        analyzer.firebase_writer.close(timeout=30)
+
+
+def _validate_upload():
+    """Return (audio_file, None) for a valid upload or (None, error response)."""
     if "audio" not in request.files:
-        return jsonify({"error": "Missing audio file"}), 400
+        return None, (jsonify({"error": "Missing audio file"}), 400)
 
     audio_file = request.files["audio"]
     if not audio_file or audio_file.filename == "":
-        return jsonify({"error": "No selected file"}), 400
+        return None, (jsonify({"error": "No selected file"}), 400)
 
     # Validate file type
     if not audio_file.filename.lower().endswith(('.wav', '.mp3', '.ogg', '.flac')):
-        return jsonify({"error": "Invalid file type. Please upload a WAV, MP3, or OGG file."}), 400
+        return None, (jsonify({"error": "Invalid file type. Please upload a WAV, MP3, or OGG file."}), 400)
+    return audio_file, None
+
+
+@app.after_request
+def _count_request(response):
+    if metrics.enabled:
+        metrics.inc("http_requests", endpoint=request.endpoint or "unknown", status=response.status_code)
+    return response
+
+
+def _wants_timings():
+    return request.args.get("timings", "").lower() in ("1", "true", "yes")
+
+
+def _record_stage(result, stage, seconds):
+    """Add an API-side stage to ``metrics`` and to the result's timings block, if any."""
+    if metrics.enabled:
+        metrics.observe_stage(stage, seconds)
+    if result is not None and result.get("timings"):
+        result["timings"]["stages_s"][stage] = seconds
+
+
+def _save_upload(audio_file):
+    with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(audio_file.filename)[1]) as tmp:
+        audio_path = tmp.name
+        audio_file.save(audio_path)
+        logger.info(f"Saved audio to temporary file: {audio_path}")
+    return audio_path
 
-    # Save to temp file
+
+def _read_upload(audio_file):
+    """The upload's bytes, or the path of a temp file for uploads above SPILL_BYTES."""
+    source = read_upload(audio_file.stream, MAX_UPLOAD_BYTES, SPILL_BYTES,
+                         suffix=os.path.splitext(audio_file.filename)[1])
+    # A spill file decoded in place now belongs to the caller (a stream outlives the request)
+    request.spill_files = [f for f in getattr(request, "spill_files", []) if f.name != source]
+    return source
+
+
+def _discard_upload(source):
+    if not is_in_memory(source):
+        try:
+            os.remove(source)
+            logger.info(f"Removed temporary file: {source}")
+        except OSError as e:
+            logger.error(f"Error removing temp file: {str(e)}")
+
+
+@app.errorhandler(413)
+def _too_large(error):
+    return jsonify({"error": f"Upload too large (limit {MAX_UPLOAD_BYTES // 2 ** 20} MB)"}), 413
+
+
+def _timeline_format(allowed=TIMELINE_FORMATS):
+    """Return (format, None) for the ?timeline= query parameter or (None, error response)."""
+    fmt = request.args.get("timeline", "legacy")
+    if fmt not in allowed:
+        return None, (jsonify({"error": f"Unsupported timeline format: {fmt}",
+                               "formats": list(allowed)}), 400)
+    if fmt == "msgpack" and importlib.util.find_spec("msgpack") is None:
+        return None, (jsonify({"error": "Timeline format msgpack needs the msgpack package",
+                               "formats": [f for f in allowed if f != "msgpack"]}), 400)
+    return fmt, None
+
+
+def _result_response(result, fmt):
+    if fmt == "msgpack":
+        return Response(pack(encode_result(result, fmt)), mimetype="application/msgpack")
+    return jsonify(encode_result(result, fmt))
+
+
+@app.route("/analyze", methods=["POST"])
+def analyze():
+    if not analyzer:
+        return jsonify({"error": "Backend analyzer not initialized"}), 500
+        
+    audio_file, error = _validate_upload()
+    if error:
+        return error
+    timeline_format, error = _timeline_format()
+    if error:
+        return error
+
+    # Read the upload into memory (or a temp file past SPILL_BYTES)
+    source = None
     try:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(audio_file.filename)[1]) as tmp:
-            audio_path = tmp.name
-            audio_file.save(audio_path)
-            logger.info(f"Saved audio to temporary file: {audio_path}")
+        start = time.perf_counter()
+        source = _read_upload(audio_file)
+        upload_s = time.perf_counter() - start
 
         # Analyze the audio
-        results = analyzer.analyze_audio(audio_path)
+        results = analyzer.analyze_audio(source, timings=_wants_timings())
+        _record_stage(results, "upload", upload_s)
         if results is None:
             return jsonify({"error": "Analysis failed - invalid audio file or processing error"}), 400
 
         # Optional Firebase save
         user_id = request.form.get("user_id")
         if user_id:
+            start = time.perf_counter()
             try:
-                analyzer.save_to_firebase(user_id, results)
-                logger.info(f"Saved analysis to Firebase for user {user_id}")
+                if analyzer.save_to_firebase(user_id, {k: v for k, v in results.items() if k != "timings"}):
+                    logger.info(f"Queued analysis for Firebase for user {user_id}")
+                else:
+                    logger.warning(f"Analysis for user {user_id} not saved: Firebase is not configured")
             except Exception as e:
                 logger.error(f"Failed to save to Firebase: {str(e)}")
                 # Continue even if Firebase save fails
+            _record_stage(results, "firebase", time.perf_counter() - start)
+
+        return _result_response(results, timeline_format)
+
+    except UploadTooLarge:
+        return _too_large(None)
 
-        return jsonify(results)
-    
     except Exception as e:
         logger.error(f"Error processing audio: {str(e)}")
         return jsonify({"error": f"Error processing audio: {str(e)}"}), 500
         
     finally:
-        # Clean up temp file
+        # Clean up the spill file, if any
+        if source is not None:
+            _discard_upload(source)
+
+@app.route("/analyze/stream", methods=["POST"])
+def analyze_stream():
+    if not analyzer:
+        return jsonify({"error": "Backend analyzer not initialized"}), 500
+
+    audio_file, error = _validate_upload()
+    if error:
+        return error
+
+    timeline_format, error = _timeline_format(("legacy", "columnar", "base64"))
+    if error:
+        return error
+    ndjson = request.args.get("format") == "ndjson"
+    timings = _wants_timings()
+    user_id = request.form.get("user_id")
+    start = time.perf_counter()
+    try:
+        source = _read_upload(audio_file)
+    except UploadTooLarge:
+        return _too_large(None)
+    upload_s = time.perf_counter() - start
+
+    def generate():
         try:
-            if 'audio_path' in locals() and os.path.exists(audio_path):
-                os.remove(audio_path)
-                logger.info(f"Removed temporary file: {audio_path}")
-        except Exception as e:
-            logger.error(f"Error removing temp file: {str(e)}")
+            for event in analyzer.analyze_audio_stream(source, timings=timings):
+                if event["type"] == "result":
+                    result = event["result"]
+                    _record_stage(result, "upload", upload_s)
+                if event["type"] == "result" and user_id:
+                    start = time.perf_counter()
+                    try:
+                        analyzer.save_to_firebase(user_id, {k: v for k, v in result.items() if k != "timings"})
+                    except Exception as e:
+                        logger.error(f"Failed to save to Firebase: {str(e)}")
+                    _record_stage(result, "firebase", time.perf_counter() - start)
+                if event["type"] == "result":
+                    event = dict(event, result=encode_result(event["result"], timeline_format))
+                if ndjson:
+                    yield json.dumps(event) + "\n"
+                else:
+                    yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            _discard_upload(source)
+
+    mimetype = "application/x-ndjson" if ndjson else "text/event-stream"
+    return Response(stream_with_context(generate()), mimetype=mimetype,
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.route("/jobs", methods=["POST"])
+def submit_job():
+    audio_file, error = _validate_upload()
+    if error:
+        return error
+
+    from voice_jobs import QueueFullError
+    queue = get_job_queue()
+    audio_path = _save_upload(audio_file)
+    try:
+        job_id = queue.submit(audio_path, user_id=request.form.get("user_id"))
+    except QueueFullError as e:
+        os.remove(audio_path)
+        response = jsonify({"error": str(e), "queue": queue.stats()})
+        response.headers["Retry-After"] = "5"
+        return response, 429
+    return jsonify({"id": job_id, "status": "queued", "status_url": f"/jobs/{job_id}"}), 202
+
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def job_status(job_id):
+    timeline_format, error = _timeline_format()
+    if error:
+        return error
+    queue = get_job_queue()
+    job = queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job id"}), 404
+    if job.get("result") is not None:
+        job = dict(job, result=encode_result(job["result"], timeline_format))
+    if timeline_format == "msgpack":
+        return Response(pack(job), mimetype="application/msgpack")
+    return jsonify(job)
+
+
+@app.route("/metrics")
+def metrics_endpoint():
+    """Prometheus scrape endpoint"""
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
 
 @app.route("/health")
 def health_check():
     """Health check endpoint"""
     return jsonify({
         "status": "healthy" if analyzer else "error",
-        "message": "Voice analysis service" + ("" if analyzer else " (analyzer not initialized)")
+        "message": "Voice analysis service" + ("" if analyzer else " (analyzer not initialized)"),
+        "model_load_times": analyzer.models.load_times() if analyzer else {}
     })
 
 if __name__ == "__main__":
     if analyzer:
+        # Load models before accepting requests so the first upload isn't slow
+        load_times = analyzer.warm_up()
+        logger.info(f"Models warmed up: {load_times}")
         logger.info("Starting voice analysis API on http://0.0.0.0:5000")
         app.run(host="0.0.0.0", port=5000, threaded=True, debug=True)
     else:
@@ -0,0 +1,217 @@
+"""Background job queue for voice analysis.
+
+``JobQueue`` hands uploads to a bounded pool of worker processes, each with its
+own ``VoiceAnalyzer`` and preloaded models, and keeps the status, progress,
+timings and result of every job for polling. Stage timings come back with each
+result and are recorded in this process's ``voice_metrics.metrics``.
+
+Example:
+    jobs = JobQueue(num_workers=2, max_queue=16)
+    job_id = jobs.submit("/tmp/upload.wav", user_id="abc")
+    jobs.get(job_id)   # {"status": "running", "progress": 0.4, ...}
+"""
+
+import logging
+import multiprocessing as mp
+import os
+import threading
+import time
+import uuid
+
+from voice_metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(Exception):
+    """Raised by ``JobQueue.submit`` when too many jobs are already waiting."""
+
+
+def _worker_main(tasks, events, analyzer_kwargs, writer_kwargs):
+    """Worker process loop: load the models once, then analyse queued uploads."""
+    import voice_metrics
+    from firebase_writer import FirebaseWriter
+    from voice_analysis import VoiceAnalyzer
+
+    # Timings travel back with each result and are recorded by the parent's registry
+    voice_metrics.metrics.enabled = False
+
+    writer = FirebaseWriter(**writer_kwargs)
+    analyzer = VoiceAnalyzer(firebase_writer=writer, **analyzer_kwargs)
+    pid = os.getpid()
+    try:
+        analyzer.warm_up()
+        _worker_loop(tasks, events, analyzer, pid)
+    finally:
+        # Worker processes do not run atexit handlers, so flush queued writes here
+        writer.close(timeout=30)
+
+
+def _worker_loop(tasks, events, analyzer, pid):
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        job_id, audio_path, user_id = task
+        events.put((job_id, "running", {"started_at": time.time(), "worker": pid}))
+
+        def progress(fraction, stage, job_id=job_id):
+            events.put((job_id, "progress", {"progress": fraction, "stage": stage}))
+
+        try:
+            result = analyzer.analyze_audio(audio_path, progress_callback=progress, timings=True)
+            if result is None:
+                events.put((job_id, "failed", {
+                    "error": "Analysis failed - invalid audio file or processing error",
+                    "finished_at": time.time()}))
+                continue
+            stages = result.pop("timings", None)
+            if user_id:
+                analyzer.save_to_firebase(user_id, result)
+            events.put((job_id, "done", {"result": result, "stages": stages, "finished_at": time.time()}))
+        except Exception as e:
+            events.put((job_id, "failed", {"error": str(e), "finished_at": time.time()}))
+        finally:
+            try:
+                os.remove(audio_path)
+            except OSError:
+                pass
+
+
+class JobQueue:
+    """Bounded queue of analysis jobs drained by a pool of worker processes.
+
+    Args:
+        num_workers (int): Number of worker processes.
+        max_queue (int): Maximum number of jobs waiting for a worker; ``submit``
+                         raises ``QueueFullError`` beyond that.
+        job_ttl_s (float): How long finished jobs are kept for polling.
+        analyzer_kwargs (dict): Keyword arguments for each worker's ``VoiceAnalyzer``.
+        firebase_timeline (str): Timeline mode of each worker's ``FirebaseWriter``.
+    """
+
+    def __init__(self, num_workers=2, max_queue=16, job_ttl_s=3600, analyzer_kwargs=None,
+                 firebase_timeline="full"):
+        self.num_workers = max(1, int(num_workers))
+        self.max_queue = max(1, int(max_queue))
+        self.job_ttl_s = job_ttl_s
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+        # spawn keeps torch/transformers state out of the forked workers
+        ctx = mp.get_context("spawn")
+        self._tasks = ctx.Queue()
+        self._events = ctx.Queue()
+        self._workers = {}
+        for _ in range(self.num_workers):
+            worker = ctx.Process(target=_worker_main, args=(self._tasks, self._events, analyzer_kwargs or {},
+                                                                 {"timeline": firebase_timeline}),
+                                 daemon=True)
+            worker.start()
+            self._workers[worker.pid] = worker
+
+        self._collector = threading.Thread(target=self._collect, daemon=True)
+        self._collector.start()
+
+    def submit(self, audio_path, user_id=None):
+        """Queue ``audio_path`` for analysis and return the job id.
+
+        The worker deletes ``audio_path`` once the job is finished.
+        """
+        with self._lock:
+            self._prune()
+            if self._count("queued") >= self.max_queue:
+                raise QueueFullError(f"Job queue is full ({self.max_queue} jobs waiting)")
+            job_id = uuid.uuid4().hex
+            self._jobs[job_id] = {
+                "id": job_id,
+                "status": "queued",
+                "progress": 0.0,
+                "stage": None,
+                "created_at": time.time(),
+                "started_at": None,
+                "finished_at": None,
+                "worker": None,
+                "result": None,
+                "stages": None,
+                "error": None,
+            }
+        self._tasks.put((job_id, audio_path, user_id))
+        return job_id
+
+    def get(self, job_id):
+        """Return a snapshot of the job with its timings, or ``None`` if unknown."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            if job["status"] == "running" and not self._worker_alive(job["worker"]):
+                job.update(status="failed", error="Worker process exited", finished_at=time.time())
+            snapshot = dict(job)
+        snapshot["timings"] = self._timings(snapshot)
+        snapshot.pop("stages")
+        return snapshot
+
+    def stats(self):
+        with self._lock:
+            return {
+                "queued": self._count("queued"),
+                "running": self._count("running"),
+                "max_queue": self.max_queue,
+                "workers": self.num_workers,
+                "workers_alive": sum(w.is_alive() for w in self._workers.values()),
+            }
+
+    def shutdown(self, timeout=10):
+        for _ in self._workers:
+            self._tasks.put(None)
+        for worker in self._workers.values():
+            worker.join(timeout)
+            if worker.is_alive():
+                worker.terminate()
+        self._events.put(None)
+
+    def _collect(self):
+        while True:
+            event = self._events.get()
+            if event is None:
+                break
+            job_id, kind, data = event
+            with self._lock:
+                job = self._jobs.get(job_id)
+                if job is None:
+                    continue
+                if kind == "progress":
+                    job.update(data)
+                elif kind == "running":
+                    job.update(data, status="running")
+                else:
+                    job.update(data, status=kind)
+                    if kind == "done":
+                        job["progress"] = 1.0
+            if kind in ("done", "failed") and metrics.enabled:
+                metrics.inc("jobs", status=kind)
+                metrics.observe(data.get("stages"))
+
+    def _count(self, status):
+        return sum(1 for job in self._jobs.values() if job["status"] == status)
+
+    def _worker_alive(self, pid):
+        worker = self._workers.get(pid)
+        return worker is None or worker.is_alive()
+
+    def _prune(self):
+        cutoff = time.time() - self.job_ttl_s
+        for job_id in [k for k, j in self._jobs.items() if j["finished_at"] and j["finished_at"] < cutoff]:
+            del self._jobs[job_id]
+
+    @staticmethod
+    def _timings(job):
+        now = time.time()
+        started, finished = job["started_at"], job["finished_at"]
+        return {
+            "queue_wait_s": (started or finished or now) - job["created_at"],
+            "run_s": ((finished or now) - started) if started else None,
+            "total_s": (finished or now) - job["created_at"],
+            "stages": job["stages"],
+        }
@@ -0,0 +1,176 @@
+"""Per-stage timers and counters for the voice analysis pipeline.
+
+Each analysis records its stage times and counters in a ``StageTimings``, which
+is folded into the process-wide ``metrics`` registry (served by ``voice_api`` at
+``/metrics``) and can be attached to the result as a ``timings`` block.
+``NULL_TIMINGS`` does nothing and is used when neither is wanted.
+
+The ``*_forward`` stages are recorded by the model calls through
+``current_timings()`` and overlap the ``windows`` and ``transcription`` stages
+that contain them; ``windows`` also includes the time a streaming consumer
+spends between window events.
+
+Example:
+    timings = StageTimings(metrics)
+    with timings.stage("decode"):
+        y, sr = load(path)
+    timings.count("bytes_decoded", os.path.getsize(path))
+    timings.publish()
+    print(metrics.render())
+"""
+
+import contextlib
+import math
+import os
+import threading
+import time
+from collections import defaultdict
+
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+
+class StageTimings:
+    """Stage durations (seconds, summed per stage) and counters of one analysis.
+
+    Args:
+        registry (MetricsRegistry): Registry that ``publish`` folds the timings into.
+    """
+
+    def __init__(self, registry=None):
+        self.registry = registry
+        self.stages = defaultdict(float)
+        self.counters = defaultdict(int)
+        self._start = time.perf_counter()
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] += time.perf_counter() - start
+
+    def add_time(self, name, seconds):
+        self.stages[name] += seconds
+
+    def count(self, name, n=1):
+        self.counters[name] += n
+
+    def as_dict(self):
+        return {
+            "total_s": time.perf_counter() - self._start,
+            "stages_s": dict(self.stages),
+            "counters": dict(self.counters),
+        }
+
+    def publish(self):
+        if self.registry is not None:
+            self.registry.observe(self.as_dict())
+
+
+class _NullTimings:
+    """Stand-in for ``StageTimings`` when nothing is recorded."""
+
+    _null_stage = contextlib.nullcontext()
+
+    def stage(self, name):
+        return self._null_stage
+
+    def add_time(self, name, seconds):
+        pass
+
+    def count(self, name, n=1):
+        pass
+
+    def as_dict(self):
+        return None
+
+    def publish(self):
+        pass
+
+
+NULL_TIMINGS = _NullTimings()
+
+_current = threading.local()
+
+
+def current_timings():
+    """Timings of the analysis running on this thread (``NULL_TIMINGS`` if none)."""
+    return getattr(_current, "timings", NULL_TIMINGS)
+
+
+def set_current_timings(timings):
+    _current.timings = timings
+
+
+class MetricsRegistry:
+    """Thread-safe process-wide stage histograms and counters.
+
+    Args:
+        enabled (bool): When False, analyses record nothing unless timings are
+                        explicitly requested, and those are not folded in here.
+        buckets (tuple): Upper bounds (seconds) of the stage histograms.
+    """
+
+    def __init__(self, enabled=True, buckets=STAGE_BUCKETS):
+        self.enabled = enabled
+        self.buckets = tuple(buckets) + (math.inf,)
+        self._lock = threading.Lock()
+        self._histograms = {}  # stage -> [bucket counts, sum, count]
+        self._counters = defaultdict(float)  # (name, labels) -> value
+
+    def observe_stage(self, stage, seconds):
+        with self._lock:
+            hist = self._histograms.setdefault(stage, [[0] * len(self.buckets), 0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    hist[0][i] += 1
+            hist[1] += seconds
+            hist[2] += 1
+
+    def inc(self, name, value=1, **labels):
+        with self._lock:
+            self._counters[(name, tuple(sorted(labels.items())))] += value
+
+    def observe(self, timings):
+        """Fold a ``StageTimings.as_dict()`` into the registry."""
+        if not timings:
+            return
+        for stage, seconds in timings.get("stages_s", {}).items():
+            self.observe_stage(stage, seconds)
+        if "total_s" in timings:
+            self.observe_stage("total", timings["total_s"])
+        for name, value in timings.get("counters", {}).items():
+            self.inc(name, value)
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        with self._lock:
+            if self._histograms:
+                lines += ["# HELP voice_stage_seconds Time spent per analysis stage.",
+                          "# TYPE voice_stage_seconds histogram"]
+            for stage, (counts, total, count) in sorted(self._histograms.items()):
+                for bound, n in zip(self.buckets, counts):
+                    le = "+Inf" if bound == math.inf else repr(bound)
+                    lines.append(f'voice_stage_seconds_bucket{{stage="{stage}",le="{le}"}} {n}')
+                lines.append(f'voice_stage_seconds_sum{{stage="{stage}"}} {_format_value(total)}')
+                lines.append(f'voice_stage_seconds_count{{stage="{stage}"}} {_format_value(count)}')
+            names = sorted({name for name, _ in self._counters})
+            for name in names:
+                lines += [f"# TYPE voice_{name}_total counter"]
+                for (counter, labels), value in sorted(self._counters.items()):
+                    if counter == name:
+                        label_text = ",".join(f'{k}="{v}"' for k, v in labels)
+                        lines.append(f"voice_{name}_total{{{label_text}}} {_format_value(value)}" if label_text
+                                     else f"voice_{name}_total {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _format_value(value):
+    """Exact sample value: whole numbers as integers, others with full float precision."""
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+metrics = MetricsRegistry(enabled=os.environ.get("VOICE_METRICS", "1") != "0")
@@ -0,0 +1,321 @@
+"""Real-time voice analysis on a live 16 kHz PCM stream.
+
+Audio is pushed into a preallocated ring buffer by whatever produces it (the
+sounddevice input callback, a WebSocket handler via ``feed_bytes``, or a file
+replayed at real-time speed), and a background thread analyses windows of it
+as soon as they are complete: emotion (via ``VoiceAnalyzer``), pitch and energy.
+
+Memory stays constant: the ring buffer is fixed-size, results are handed to a
+callback instead of being collected, and latency statistics use a bounded
+history. When the analysis falls behind by more than ``max_lag_s``, windows are
+either dropped (jump straight to the newest window) or coalesced (all pending
+windows go through the model as one batch, oldest ones beyond ``batch_size``
+dropped).
+
+Usage:
+    python voice_realtime.py --mic
+    python voice_realtime.py --replay test_audio.wav
+"""
+
+import argparse
+import collections
+import json
+import logging
+import threading
+import time
+
+import numpy as np
+
+from audio_features import FeaturePlane
+from audio_io import load_file
+
+logger = logging.getLogger(__name__)
+
+
+class RingBuffer:
+    """Fixed-size float32 sample buffer addressed by absolute sample index.
+
+    ``total`` counts every sample ever written; samples ``[total - capacity, total)``
+    are still available. Not thread-safe on its own.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = int(capacity)
+        self.total = 0
+        self._buf = np.zeros(self.capacity, dtype=np.float32)
+
+    def write(self, samples):
+        samples = np.asarray(samples, dtype=np.float32).ravel()
+        n = len(samples)
+        if n > self.capacity:
+            self.total += n - self.capacity
+            samples = samples[-self.capacity:]
+            n = self.capacity
+        pos = self.total % self.capacity
+        first = min(n, self.capacity - pos)
+        self._buf[pos:pos + first] = samples[:first]
+        self._buf[:n - first] = samples[first:]
+        self.total += n
+
+    @property
+    def oldest(self):
+        return max(0, self.total - self.capacity)
+
+    def read(self, start, length, out=None):
+        """Copy samples ``[start, start + length)`` into ``out`` (allocated if omitted)."""
+        if start < self.oldest or start + length > self.total:
+            raise ValueError(f"Samples {start}..{start + length} not in buffer ({self.oldest}..{self.total})")
+        if out is None:
+            out = np.empty(length, dtype=np.float32)
+        pos = start % self.capacity
+        first = min(length, self.capacity - pos)
+        out[:first] = self._buf[pos:pos + first]
+        out[first:length] = self._buf[:length - first]
+        return out
+
+
+class RealtimeAnalyzer:
+    """Incremental windowed analysis of a live audio stream.
+
+    Args:
+        analyzer (VoiceAnalyzer): Provides the emotion model; without one (or
+                                  without its models) only pitch and energy are reported.
+        sr (int): Sample rate of the incoming stream.
+        window_s (float): Analysis window length in seconds.
+        hop_s (float): Time between consecutive windows in seconds.
+        buffer_s (float): Ring buffer length in seconds.
+        max_lag_s (float): How far behind the newest audio the analysis may fall
+                           before windows are dropped or coalesced.
+        policy (str): "drop" or "coalesce" (see module docstring).
+        batch_size (int): Maximum number of windows per model forward.
+        on_result (callable): Called with one dict per analysed window.
+    """
+
+    def __init__(self, analyzer=None, sr=16000, window_s=1.0, hop_s=0.25, buffer_s=10.0,
+                 max_lag_s=1.0, policy="drop", batch_size=8, on_result=None):
+        if policy not in ("drop", "coalesce"):
+            raise ValueError(f"Unknown policy: {policy}")
+        self.analyzer = analyzer
+        self.sr = sr
+        self.win_len = int(window_s * sr)
+        self.hop_len = int(hop_s * sr)
+        self.max_lag = int(max_lag_s * sr)
+        self.policy = policy
+        self.batch_size = max(1, int(batch_size))
+        self.on_result = on_result or (lambda result: None)
+        self.ring = RingBuffer(max(int(buffer_s * sr), self.win_len + self.max_lag + self.hop_len))
+
+        self._cond = threading.Condition()
+        self._arrivals = collections.deque(maxlen=4096)  # (samples written so far, wall time)
+        self._windows = np.empty((self.batch_size, self.win_len), dtype=np.float32)
+        self._thread = None
+        self._running = False
+        self._next_start = 0
+
+        self._latencies = collections.deque(maxlen=500)
+        self._rtfs = collections.deque(maxlen=500)
+        self.windows_processed = 0
+        self.windows_dropped = 0
+        self.windows_failed = 0
+
+    def feed(self, samples):
+        """Append float samples in [-1, 1] to the stream (safe to call from audio callbacks)."""
+        now = time.perf_counter()
+        with self._cond:
+            self.ring.write(samples)
+            self._arrivals.append((self.ring.total, now))
+            self._cond.notify()
+
+    def feed_bytes(self, data):
+        """Append little-endian int16 PCM bytes, e.g. a WebSocket binary message."""
+        self.feed(np.frombuffer(data, dtype="<i2").astype(np.float32) / 32768.0)
+
+    def start(self):
+        """Warm up the analysis on a synthetic window, then start the analysis thread.
+
+        The first call pays for model and pitch tracker initialisation (numba
+        compilation with the "yin" backend), which would otherwise make the first
+        live windows fall behind and get dropped.
+        """
+        t = np.arange(self.win_len, dtype=np.float32) / self.sr
+        self._analyze(0.1 * np.sin(2 * np.pi * 150 * t)[None, :])
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, drain=True):
+        """Stop the analysis thread, by default after the complete windows already fed."""
+        if drain:
+            with self._cond:
+                while self._running and self.ring.total >= self._next_start + self.win_len:
+                    self._cond.wait(0.05)
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+
+    def stats(self):
+        latencies = np.array(self._latencies) if self._latencies else np.zeros(1)
+        return {
+            "windows_processed": self.windows_processed,
+            "windows_dropped": self.windows_dropped,
+            "windows_failed": self.windows_failed,
+            "rtf_mean": float(np.mean(self._rtfs)) if self._rtfs else 0.0,
+            "latency_p50_s": float(np.percentile(latencies, 50)),
+            "latency_p95_s": float(np.percentile(latencies, 95)),
+        }
+
+    def _arrival_time(self, sample_end):
+        for total, arrived in self._arrivals:
+            if total >= sample_end:
+                return arrived
+        return time.perf_counter()
+
+    def _take_windows(self):
+        """Pick the next window starts (under the lock) and copy them out of the ring."""
+        # Windows already overwritten in the ring are lost whatever the policy
+        overwritten = 0
+        if self._next_start < self.ring.oldest:
+            overwritten = -(-(self.ring.oldest - self._next_start) // self.hop_len)
+            self._next_start += overwritten * self.hop_len
+
+        lag = self.ring.total - (self._next_start + self.win_len)
+        pending = lag // self.hop_len + 1
+        dropped = 0
+        if lag > self.max_lag:
+            if self.policy == "drop":
+                dropped, pending = pending - 1, 1
+            elif pending > self.batch_size:
+                dropped, pending = pending - self.batch_size, self.batch_size
+            self._next_start += dropped * self.hop_len
+        dropped += overwritten
+        n = min(pending, self.batch_size)
+        starts = [self._next_start + i * self.hop_len for i in range(n)]
+        for i, start in enumerate(starts):
+            self.ring.read(start, self.win_len, out=self._windows[i])
+        arrivals = [self._arrival_time(start + self.win_len) for start in starts]
+        self._next_start = starts[-1] + self.hop_len
+        return starts, self._windows[:n].copy(), arrivals, dropped
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._running and self.ring.total < self._next_start + self.win_len:
+                    self._cond.wait(0.1)
+                if not self._running:
+                    return
+                starts, windows, arrivals, dropped = self._take_windows()
+                self._cond.notify_all()
+
+            began = time.perf_counter()
+            self.windows_dropped += dropped
+            try:
+                results = self._analyze(windows)
+            except Exception:
+                # Keep the stream going: a failed batch is counted and skipped
+                logger.exception(f"Analysis of {len(starts)} windows failed")
+                self.windows_failed += len(starts)
+                continue
+            done = time.perf_counter()
+            rtf = (done - began) / (len(starts) * self.hop_len / self.sr)
+            for i, (start, arrived, result) in enumerate(zip(starts, arrivals, results)):
+                latency = done - arrived
+                self._latencies.append(latency)
+                self._rtfs.append(rtf)
+                self.windows_processed += 1
+                result.update({
+                    "start": start / self.sr,
+                    "end": (start + self.win_len) / self.sr,
+                    "latency_s": latency,
+                    "rtf": rtf,
+                    "dropped_before": dropped if i == 0 else 0,
+                })
+                try:
+                    self.on_result(result)
+                except Exception:
+                    logger.exception("on_result callback failed")
+
+    def _analyze(self, windows):
+        results = [{} for _ in windows]
+        analyzer = self.analyzer
+        if analyzer is not None and analyzer.models_available() and analyzer.model is not None:
+            for result, emo in zip(results, analyzer.detect_emotion_batch(windows, self.sr)):
+                result.update(emotion=emo["emotion"], confidence=emo["confidence"])
+        fmin = analyzer.MIN_PITCH_HZ if analyzer is not None else 75
+        fmax = analyzer.MAX_PITCH_HZ if analyzer is not None else 400
+        for result, window in zip(results, windows):
+            result["energy"] = float(np.sqrt(np.mean(window ** 2)))
+            result["pitch"] = _window_pitch(window, self.sr, fmin, fmax,
+                                            analyzer.pitch_backend if analyzer is not None else "autocorr")
+        return results
+
+
+def _window_pitch(window, sr, fmin, fmax, backend="autocorr"):
+    f0 = FeaturePlane(window, sr).f0(backend, fmin, fmax)
+    voiced = f0[f0 > 0]
+    return float(np.median(voiced)) if len(voiced) else 0.0
+
+
+def stream_microphone(rt, device=None, blocksize=1600):
+    """Feed the default (or given) input device into ``rt`` until interrupted."""
+    import sounddevice as sd
+
+    def callback(indata, frames, time_info, status):
+        if status:
+            logger.warning(f"Audio input status: {status}")
+        rt.feed(indata[:, 0])
+
+    with sd.InputStream(samplerate=rt.sr, channels=1, dtype="float32", blocksize=blocksize,
+                        device=device, callback=callback):
+        try:
+            while True:
+                time.sleep(0.5)
+        except KeyboardInterrupt:
+            pass
+
+
+def replay_file(rt, audio_path, chunk_s=0.1, realtime=True):
+    """Feed an audio file into ``rt`` in ``chunk_s`` chunks, paced at real-time speed."""
+    resampler = rt.analyzer.resampler if rt.analyzer is not None else "auto"
+    y, _ = load_file(audio_path, rt.sr, resampler=resampler)
+    chunk = int(chunk_s * rt.sr)
+    began = time.perf_counter()
+    for i in range(0, len(y), chunk):
+        if realtime:
+            delay = began + i / rt.sr - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        rt.feed(y[i:i + chunk])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Real-time voice analysis from a microphone or replayed file.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--mic", action="store_true", help="Analyse the default input device")
+    source.add_argument("--replay", help="Replay this audio file at real-time speed")
+    parser.add_argument("--hop", type=float, default=0.25, help="Seconds between analysis windows")
+    parser.add_argument("--policy", choices=["drop", "coalesce"], default="drop")
+    parser.add_argument("--basic", action="store_true", help="Skip the emotion model (pitch/energy only)")
+    args = parser.parse_args()
+
+    analyzer = None
+    if not args.basic:
+        from voice_analysis import VoiceAnalyzer
+        analyzer = VoiceAnalyzer()
+        analyzer.warm_up(["emotion"])
+
+    rt = RealtimeAnalyzer(analyzer, hop_s=args.hop, policy=args.policy,
+                          on_result=lambda result: print(json.dumps(result)))
+    rt.start()
+    if args.mic:
+        stream_microphone(rt)
+    else:
+        replay_file(rt, args.replay)
+    rt.stop()
+    print(json.dumps(rt.stats(), indent=2))
+
+
+if __name__ == "__main__":
+    main()